@@ -0,0 +1,265 @@
+"""
+Pre-aggregated review measures.
+
+A `Cube` holds the sum and count of each review measure for every observed
+combination of its dimensions (vendor, week, item, topic, ...). Charts get
+their series by selecting and rolling up cells instead of scanning reviews:
+the vendor x week cube gives both the all-vendor and the single-vendor weekly
+series and the week-over-week KPIs of every vendor, the vendor x month cube
+feeds the movers tables. The vendor x item x week cube rolls up into the
+most reviewed items of each vendor and the weekly series of any one item.
+
+Sentiment is also binned per vendor on fixed edges, so its histogram is a
+row of counts whatever the number of reviews.
+
+The cubes whose last dimension is a period are updated rather than rebuilt
+when a reload brings a new version: a fingerprint of each period's rows finds
+the first period that changed, the cells before it are kept, and only the
+rows from that period on are grouped again.
+
+Author: Derrick Lewis
+"""
+import numpy as np
+import pandas as pd
+
+from apps import data
+
+MEASURES = ['item_rating', 'sentiment']
+
+TOP_ITEMS = 20
+
+# 41 bins of width 0.05 centred on -1, -0.95, ..., 1; sentiment scores are in [-1, 1]
+SENTIMENT_EDGES = np.linspace(-1.025, 1.025, 42)
+
+
+def _fingerprint(df:pd.DataFrame, dims:list, measures:list) -> pd.DataFrame:
+    """
+    Per value of the last of `dims` (a categorical period): the row count and
+    a checksum, the sum over its rows of the measures weighted by a hash of
+    the row's other dimensions. Any edit to a period's rows changes one or
+    the other, short of a collision.
+    """
+    period = df[dims[-1]]
+    n = len(period.cat.categories)
+    # rows without a period go to an extra bin, dropped at the end
+    codes = period.cat.codes.to_numpy().astype(np.int64)
+    codes[codes < 0] = n
+    weights = np.ones(len(codes))
+    for dim in dims[:-1]:
+        column = df[dim]
+        hashes = pd.util.hash_array(column.cat.categories.astype(str).to_numpy()) % 65521 + 1
+        weights += np.append(hashes, 0)[column.cat.codes.to_numpy()]
+    # each measure on its own scale, shifted so that a value of 0 still counts
+    values = np.full(len(codes), 1.0)
+    for i, m in enumerate(measures):
+        column = df[m].to_numpy()
+        values += (np.nan_to_num(column) if column.dtype.kind == 'f' else column) * np.sqrt(i + 2)
+    fingerprint = pd.DataFrame({
+        'rows': np.bincount(codes, minlength=n + 1),
+        'checksum': np.bincount(codes, values * weights, minlength=n + 1),
+    }).iloc[:n].set_axis(pd.Index(period.cat.categories, name=dims[-1]))
+    return fingerprint[fingerprint['rows'] > 0]
+
+
+class Cube:
+
+    def __init__(self, cells:pd.DataFrame):
+        # index: one level per dimension; columns: '<measure>_sum', '<measure>_count'
+        self.cells = cells
+        # per period, see `_fingerprint`; worked out by `update`
+        self.fingerprint = None
+        # leading periods whose cells `update` took from the previous cube
+        self.reused = 0
+
+    @property
+    def dims(self) -> list:
+        return list(self.cells.index.names)
+
+    @classmethod
+    def build(cls, df:pd.DataFrame, dims:list, measures:list=MEASURES) -> 'Cube':
+        """Aggregate review rows in one groupby pass."""
+        cells = df.groupby(dims, observed=True).agg(
+            **{f'{m}_{agg}': (m, agg) for m in measures for agg in ('sum', 'count')}
+        )
+        return cls(cells.sort_index())
+
+    @classmethod
+    def update(cls, previous:'Cube', previous_df:pd.DataFrame, df:pd.DataFrame, dims:list,
+               measures:list=MEASURES) -> 'Cube':
+        """
+        `build` of `df`, where the last of `dims` is a period. The cells of
+        `previous`, built from `previous_df`, are kept for the leading periods
+        whose rows are the same in both frames; only the rows of the periods
+        from the first changed one on are grouped.
+        """
+        if previous.fingerprint is None:
+            previous.fingerprint = _fingerprint(previous_df, dims, measures)
+        fingerprint = _fingerprint(df, dims, measures)
+        old = previous.fingerprint
+        same = fingerprint.iloc[:len(old)]
+        same = (same.index == old.index[:len(same)]) & (same.to_numpy() == old.to_numpy()[:len(same)]).all(axis=1)
+        reused = len(same) if same.all() else int(np.argmin(same))
+        rows = fingerprint['rows'].to_numpy()
+        if rows[reused:].sum() * 2 > rows.sum():
+            # most rows changed; grouping them all is faster than merging
+            cube = cls.build(df, dims, measures)
+        else:
+            # every row from the first changed period on
+            periods = df[dims[-1]]
+            tail = np.append(~periods.cat.categories.isin(fingerprint.index[:reused]), False)
+            changed = df[dims + measures].iloc[np.flatnonzero(tail[periods.cat.codes.to_numpy()])]
+            kept = previous.cells[previous.cells.index.get_level_values(-1).isin(fingerprint.index[:reused])]
+            cells = pd.concat([kept, cls.build(changed, dims, measures).cells])
+            # on the categories of this version, as `build` gives them
+            cells.index = pd.MultiIndex.from_arrays(
+                [pd.Categorical(cells.index.get_level_values(dim), categories=df[dim].cat.categories) for dim in dims],
+                names=dims)
+            cube = cls(cells.sort_index())
+            cube.reused = reused
+        cube.fingerprint = fingerprint
+        return cube
+
+    def rollup(self, dims:list) -> 'Cube':
+        """Sum the cells over every dimension not in `dims`."""
+        if list(dims) == self.dims:
+            return self
+        return Cube(self.cells.groupby(level=dims, observed=True).sum())
+
+    def where(self, **selection) -> 'Cube':
+        """Cells matching `dimension=value`, without the selected dimensions."""
+        cells = self.cells
+        for dim, value in selection.items():
+            cells = cells.xs(value, level=dim, drop_level=True)
+        return Cube(cells)
+
+    def stats(self, measure:str) -> pd.DataFrame:
+        """`sum`, `count` and `mean` of `measure` for each cell."""
+        stats = self.cells[[f'{measure}_sum', f'{measure}_count']].copy()
+        stats.columns = ['sum', 'count']
+        stats['mean'] = stats['sum'] / stats['count']
+        return stats
+
+
+def _period_cube(ds:data.Dataset, name:str, dims:list) -> Cube:
+    """Cube over `dims`, updated from the previous version's during a reload"""
+    previous = ds.built_before(name)
+    if previous is None:
+        return Cube.build(ds.frames['reviews'], dims)
+    cube = Cube.update(previous, ds.previous.frames['reviews'], ds.frames['reviews'], dims)
+    print(f"{name}: cells of {cube.reused} of {len(cube.fingerprint)} periods kept ({ds.version})")
+    return cube
+
+
+@data.derive('vendor_week')
+def vendor_week(ds:data.Dataset) -> Cube:
+    return _period_cube(ds, 'vendor_week', ['vendor_id', 'week_for_plot'])
+
+
+@data.derive('vendor_month')
+def vendor_month(ds:data.Dataset) -> Cube:
+    return _period_cube(ds, 'vendor_month', ['vendor_id', 'month_for_plot'])
+
+
+@data.derive('vendor_item_week')
+def vendor_item_week(ds:data.Dataset) -> Cube:
+    return _period_cube(ds, 'vendor_item_week', ['vendor_id', 'item_id', 'week_for_plot'])
+
+
+@data.derive('vendor_item')
+def vendor_item(ds:data.Dataset) -> Cube:
+    return ds.derived('vendor_item_week').rollup(['vendor_id', 'item_id'])
+
+
+@data.derive('item_week')
+def item_week(ds:data.Dataset) -> Cube:
+    return ds.derived('vendor_item_week').rollup(['item_id', 'week_for_plot'])
+
+
+@data.derive('top_items')
+def top_items(ds:data.Dataset) -> dict:
+    """
+    `{vendor_id: frame}` of the `TOP_ITEMS` most reviewed items of every vendor
+    and of 'all': `item_id`, `sum`, `count` and `mean` rating, most reviewed
+    first.
+    """
+    cube = ds.derived('vendor_item')
+    items = cube.stats('item_rating').reset_index()
+    items = items.sort_values(['vendor_id', 'count'], ascending=[True, False], kind='stable')
+    items = items.groupby('vendor_id', observed=True).head(TOP_ITEMS)
+    top = {str(vendor_id): group.drop(columns='vendor_id').reset_index(drop=True)
+           for vendor_id, group in items.groupby('vendor_id', observed=True)}
+    overall = cube.rollup(['item_id']).stats('item_rating').sort_values('count', ascending=False, kind='stable')
+    top['all'] = overall.head(TOP_ITEMS).reset_index()
+    return top
+
+
+@data.derive('sentiment_histogram')
+def sentiment_histogram(ds:data.Dataset) -> pd.DataFrame:
+    """
+    Review count in each `SENTIMENT_EDGES` bin (columns 0..40) and the mean
+    sentiment, one row per vendor plus 'all'.
+    """
+    df = ds.frames['reviews']
+    sentiment = df['sentiment'].to_numpy(dtype='float64', na_value=np.nan)
+    vendors = df['vendor_id'].cat.codes.to_numpy().astype(np.int64)
+    n = len(SENTIMENT_EDGES) - 1
+    bins = np.clip(np.searchsorted(SENTIMENT_EDGES, sentiment, side='right') - 1, 0, n - 1)
+    scored = ~np.isnan(sentiment)
+    by_vendor = scored & (vendors >= 0)
+    counts = np.bincount(vendors[by_vendor] * n + bins[by_vendor],
+                         minlength=len(df['vendor_id'].cat.categories) * n)
+    histogram = pd.DataFrame(counts.reshape(-1, n), index=df['vendor_id'].cat.categories.astype(str))
+    histogram.loc['all'] = np.bincount(bins[scored], minlength=n)
+    means = df.groupby('vendor_id', observed=False)['sentiment'].mean()
+    histogram['mean'] = pd.concat([means.set_axis(means.index.astype(str)), pd.Series({'all': df['sentiment'].mean()})])
+    return histogram
+
+
+@data.derive('vendor_kpis')
+def vendor_kpis(ds:data.Dataset) -> pd.DataFrame:
+    return week_over_week(ds.derived('vendor_week'))
+
+
+def week_over_week(cube:Cube, measure:str='item_rating') -> pd.DataFrame:
+    """
+    Latest week, the week with reviews before it and the overall mean of
+    `measure` for each group of the cube's leading dimensions. The last
+    dimension must be the (ordered) week. A cube with only the week dimension
+    gives a single row labelled 'all'.
+    """
+    cells = cube.cells
+    if len(cube.dims) == 1:
+        cells = pd.concat({'all': cells}, names=['group'])
+    stats = Cube(cells).stats(measure).reset_index(cells.index.names[-1])
+    groups = stats.groupby(level=list(range(stats.index.nlevels)), observed=True, sort=False)
+    last = groups.nth(-1)
+    before = groups.nth(-2)
+    totals = groups[['sum', 'count']].sum()
+    kpis = pd.DataFrame({
+        'last_week_start': last.iloc[:, 0],
+        'reviews_last_week': last['count'],
+        'mean_last_week': last['mean'],
+        'mean_week_before': before['mean'],
+        'total_reviews': totals['count'],
+        'mean': totals['sum'] / totals['count'],
+    })
+    kpis['delta_WoW'] = kpis['mean_last_week'] - kpis['mean_week_before']
+    kpis['delta_mean'] = kpis['mean_last_week'] - kpis['mean']
+    return kpis
+
+
+def weekly(ds:data.Dataset, feature:str, vendor_id:str=None) -> pd.DataFrame:
+    """Weekly sum, count and mean of `feature` for one vendor, or all vendors."""
+    cube = ds.derived('vendor_week')
+    if vendor_id:
+        cube = cube.where(vendor_id=vendor_id)
+    return cube.rollup(['week_for_plot']).stats(feature)
+
+
+def item_weekly(ds:data.Dataset, feature:str, item_id:str, vendor_id:str=None) -> pd.DataFrame:
+    """Weekly sum, count and mean of `feature` for one item, from one vendor or all vendors."""
+    if vendor_id:
+        cube = ds.derived('vendor_item_week').where(vendor_id=vendor_id, item_id=item_id)
+    else:
+        cube = ds.derived('item_week').where(item_id=item_id)
+    return cube.stats(feature)
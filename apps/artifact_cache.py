@@ -0,0 +1,153 @@
+"""
+Read-through disk cache for the parquet artifacts in GCS.
+
+Each artifact is copied to local disk next to a small json sidecar that records
+the object generation it was downloaded from. On later fetches only the object
+metadata is requested; the download is skipped when the generation hasn't
+changed. If the metadata request fails or takes longer than `timeout` seconds,
+the last good copy is served, as long as it was confirmed current within
+`max_staleness` seconds. Downloads are not timed out: a large new generation
+is downloaded to the end, however long that takes, before it replaces the copy.
+
+The copy only outlives the worker that downloaded it, not the instance: on
+App Engine standard /tmp is an in-memory filesystem that starts empty on
+every instance, so a cached file costs a second copy of the artifact in RAM.
+There the cache is off by default (`DATA_CACHE=0`) and `fetch` returns the
+remote path itself, which the parquet reader opens through fsspec. Set
+`DATA_CACHE=1` to keep copies anyway, e.g. for workers restarting on a
+long-lived instance.
+
+Works with any fsspec filesystem, so a `memory` or `file` filesystem can stand
+in for GCS when running offline.
+
+Author: Derrick Lewis
+"""
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fsspec
+
+ENABLED = os.getenv('DATA_CACHE', '0' if os.getenv('GAE_ENV') == 'standard' else '1') == '1'
+CACHE_DIR = os.getenv('DATA_CACHE_DIR', '/tmp/dashapp_cache')
+MAX_STALENESS = float(os.getenv('DATA_CACHE_MAX_STALENESS', 24 * 60 * 60))
+TIMEOUT = float(os.getenv('DATA_CACHE_TIMEOUT', 30))
+
+# gcsfs reports `generation`; other filesystems fall back to etag, checksum
+# or modification time.
+_VERSION_KEYS = ('generation', 'etag', 'md5Hash', 'mtime', 'LastModified', 'created')
+
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='artifact-cache')
+
+
+class StaleArtifactError(RuntimeError):
+    """Remote is unreachable and there is no local copy recent enough to serve."""
+
+
+class ArtifactCache:
+
+    def __init__(self, fs:fsspec.AbstractFileSystem, cache_dir:str=CACHE_DIR,
+                 max_staleness:float=MAX_STALENESS, timeout:float=TIMEOUT, enabled:bool=ENABLED):
+        self.fs = fs
+        self.cache_dir = cache_dir
+        self.max_staleness = max_staleness
+        self.timeout = timeout
+        self.enabled = enabled
+        if enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _local_path(self, remote:str) -> str:
+        digest = hashlib.sha1(remote.encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{digest}-{os.path.basename(remote)}")
+
+    def _read_meta(self, local:str) -> dict:
+        try:
+            with open(f"{local}.json") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, local:str, meta:dict) -> None:
+        tmp = f"{local}.{os.getpid()}.json.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, f"{local}.json")
+
+    def _remove_leftovers(self, local:str) -> None:
+        """Remove partial downloads of `local` left by processes that are gone."""
+        for path in glob.glob(f"{glob.escape(local)}.*.download"):
+            pid = path[len(local) + 1:-len('.download')]
+            if pid.isdigit() and _running(int(pid)):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def version(self, remote:str) -> str:
+        """Current generation of the remote object, as a string."""
+        info = _pool.submit(self.fs.info, remote).result(timeout=self.timeout)
+        for key in _VERSION_KEYS:
+            if info.get(key) is not None:
+                return f"{key}:{info[key]}"
+        return f"size:{info.get('size')}"
+
+    def fetch(self, remote:str) -> tuple:
+        """
+        Return `(local_path, version)` for `remote`, downloading it only when
+        the remote generation differs from the cached one. With the cache
+        off, `remote` itself is returned and nothing is downloaded.
+        """
+        if not self.enabled:
+            return remote, self.version(remote)
+        local = self._local_path(remote)
+        meta = self._read_meta(local)
+        have_copy = os.path.exists(local) and 'version' in meta
+        try:
+            version = self.version(remote)
+            if not have_copy or meta['version'] != version:
+                self._remove_leftovers(local)
+                tmp = f"{local}.{os.getpid()}.download"
+                try:
+                    self.fs.get_file(remote, tmp)
+                    os.replace(tmp, local)
+                finally:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+                print(f"Downloaded {remote} ({version})")
+        except Exception as e:
+            if not have_copy:
+                raise
+            age = time.time() - meta['verified_at']
+            if age > self.max_staleness:
+                raise StaleArtifactError(
+                    f"{remote} unreachable and cached copy is {age:.0f}s old"
+                ) from e
+            print(f"Serving cached {remote}, last verified {age:.0f}s ago: {e!r}")
+            return local, meta['version']
+        self._write_meta(local, {'remote': remote, 'version': version, 'verified_at': time.time()})
+        return local, version
+
+
+def _running(pid:int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+_caches = {}
+
+
+def cache_for(url:str) -> ArtifactCache:
+    """Shared cache for the filesystem `url` lives on."""
+    protocol = fsspec.utils.get_protocol(url)
+    if protocol not in _caches:
+        _caches[protocol] = ArtifactCache(fsspec.filesystem(protocol))
+    return _caches[protocol]
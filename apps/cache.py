@@ -0,0 +1,107 @@
+"""
+Bounded LRU caches for rendered results.
+
+Each cache is limited both by entry count and by an estimate of the bytes its
+values hold, evicting least recently used entries first. Keys start with the
+dataset version, and entries for older versions are dropped when a new
+dataset is swapped in. Hit, miss and eviction counters
+of every cache are served as json from `/metrics/cache`.
+
+Author: Derrick Lewis
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from flask import jsonify
+
+from apps import data
+from main import server
+
+RESULT_CACHE_ENTRIES = int(os.getenv('RESULT_CACHE_ENTRIES', 512))
+RESULT_CACHE_MB = float(os.getenv('RESULT_CACHE_MB', 128))
+
+CACHES = {}
+
+
+def estimate_size(value) -> int:
+    """Rough size in bytes of a cached value."""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+
+    def __init__(self, name:str, max_entries:int=RESULT_CACHE_ENTRIES, max_bytes:float=RESULT_CACHE_MB * 2**20):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        CACHES[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, size:int=None) -> None:
+        size = estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def drop(self, predicate) -> None:
+        """Remove every entry whose key matches `predicate`."""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self.bytes -= self._entries.pop(key)[1]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': int(self.max_bytes),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+@data.on_reload
+def _drop_old_versions(old, new) -> None:
+    for cache in CACHES.values():
+        cache.drop(lambda key: key[0] != new.version)
+
+
+@server.route('/metrics/cache')
+def cache_metrics():
+    return jsonify({name: cache.stats() for name, cache in CACHES.items()})
@@ -0,0 +1,305 @@
+"""
+Shared dataset registry.
+
+Loads the parquet artifacts produced by `eda.py` once per process and hands
+the pages read-only views, so a gunicorn worker only ever holds one copy of
+each frame. Artifacts are read through the local disk cache in
+`apps.artifact_cache` (or straight from GCS where it is off) and the parquet dataset API, so only the columns some
+page uses are decoded, and `scan` reads the rows matching a filter (one
+vendor, a date range) straight from the file, decoding only the row groups
+that can match. Rows of one vendor or item are looked up in memory through
+`apps.row_index`.
+Frames are converted to the compact dtypes in `apps.schema` as they are read.
+With `DATA_SNAPSHOT=1` the frames are memory-mapped from a shared Arrow file
+instead (see `apps.snapshot`).
+
+Everything loaded for one set of artifact versions lives in a `Dataset`,
+together with the structures pages derive from it (registered with `derive`).
+Nothing is loaded until a page first asks for data. A background thread then
+polls the artifact generations and, when `eda.py` publishes new ones, builds
+a new `Dataset` off the request path before swapping it in. Callbacks take `current()` once and use that object
+throughout, so they never see a mix of old and new data.
+
+Author: Derrick Lewis
+"""
+import hashlib
+import os
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fsspec
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+from apps import schema, snapshot
+from apps.artifact_cache import cache_for
+
+load_dotenv()
+
+# Views handed out by `get` share memory with the registry copy. Copy-on-write
+# makes any in-place change a page makes land on its own copy instead.
+pd.set_option('mode.copy_on_write', True)
+
+DATA_ROOT = os.getenv('DATA_ROOT', 'gs://dashapp_project_assests')
+REFRESH_SECONDS = float(os.getenv('DATA_REFRESH_SECONDS', 300))
+
+ARTIFACTS = {
+    'reviews': 'df.parquet',
+    'topics': 'topics_df.parquet',
+}
+
+# Columns of the reviews frame each page reads. The registry only decodes the
+# union of these.
+CONSUMERS = {
+    'analysis': ['vendor_id', 'item_rating', 'sentiment', 'tokenized', 'topics',
+                 'week_for_plot', 'month_for_plot'],
+    'dashboard': ['vendor_id', 'item_id', 'order_date', 'item_rating', 'sentiment',
+                  'tokenized', 'consumer_comment', 'week_for_plot'],
+}
+
+_load_lock = threading.Lock()
+_current = None
+_builders = {}
+_reload_hooks = []
+_load_hooks = []
+
+
+def _columns(name:str) -> list:
+    if name != 'reviews':
+        return None
+    return list(dict.fromkeys(col for cols in CONSUMERS.values() for col in cols))
+
+
+def _remote(name:str) -> str:
+    return f"{DATA_ROOT}/{ARTIFACTS[name]}"
+
+
+def _read_parquet(path:str, columns:list=None, filters:list=None) -> pd.DataFrame:
+    filesystem = None
+    if fsspec.utils.get_protocol(path) != 'file':
+        # the remote artifact itself, when the artifact cache is off
+        filesystem, path = fsspec.core.url_to_fs(path)
+    dataset = ds.dataset(path, format='parquet', filesystem=filesystem)
+    expression = pq.filters_to_expression(filters) if filters else None
+    return schema.compact(dataset.to_table(columns=columns, filter=expression))
+
+
+def _read(name:str) -> tuple:
+    start = time.perf_counter()
+    remote = _remote(name)
+    local, version = cache_for(remote).fetch(remote)
+    columns = _columns(name)
+    info = {'path': local, 'version': version}
+    if snapshot.ENABLED:
+        frame, info['snapshot'] = snapshot.load(
+            name, version, lambda: _read_parquet(local, columns), columns
+        )
+    else:
+        frame = _read_parquet(local, columns)
+    seconds = time.perf_counter() - start
+    return frame, {
+        **info,
+        'rows': len(frame),
+        'load_seconds': round(seconds, 3),
+        'memory_bytes': int(frame.memory_usage(deep=True).sum()),
+    }
+
+
+class Dataset:
+    """
+    One version of every artifact and the structures derived from it.
+    """
+
+    def __init__(self, frames:dict, stats:dict):
+        self.frames = frames
+        self.stats = stats
+        self.version = hashlib.sha1(
+            '|'.join(stats[name]['version'] for name in sorted(frames)).encode()
+        ).hexdigest()[:12]
+        self._derived = {}
+        # one lock per derived name, so a slow build only holds up the
+        # builds waiting for that structure
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        # the version this one replaces, while `reload` builds it
+        self.previous = None
+
+    def get(self, name:str, consumer:str=None) -> pd.DataFrame:
+        """
+        Return a read-only view of the named artifact, limited to the columns
+        listed for `consumer` in `CONSUMERS` when one is given.
+        """
+        if consumer:
+            return self.frames[name][CONSUMERS[consumer]]
+        return self.frames[name].copy(deep=False)
+
+    def scan(self, name:str, columns:list=None, filters:list=None) -> pd.DataFrame:
+        """
+        Read `columns` of the named artifact for the rows matching `filters`, in
+        pyarrow's list-of-tuples form, e.g.
+        `[('vendor_id', '==', '9150'), ('order_date', '>=', pd.Timestamp('2023-09-01'))]`.
+
+        Reads this version's locally cached file (the remote one when the
+        artifact cache is off), skipping row groups whose statistics rule out a
+        match, so columns no page holds in memory can be read too. Returns a new
+        frame rather than a view.
+        """
+        return _read_parquet(self.stats[name]['path'], columns, filters)
+
+    def derived(self, name:str):
+        """The structure registered as `name` with `derive`, built on first use."""
+        try:
+            return self._derived[name]
+        except KeyError:
+            pass
+        with self._locks_lock:
+            lock = self._locks.setdefault(name, threading.RLock())
+        with lock:
+            if name not in self._derived:
+                self._derived[name] = _builders[name](self)
+            return self._derived[name]
+
+    def built_before(self, name:str):
+        """
+        `name` as built on the version this one replaces, for builders that
+        update the previous structure rather than start over. None outside a
+        reload, or if the previous version never built it.
+        """
+        previous = self.previous
+        if previous is None or name not in previous.built():
+            return None
+        return previous.derived(name)
+
+    def built(self) -> list:
+        """Names of the derived structures built so far."""
+        return list(self._derived)
+
+    def build(self, names:list) -> None:
+        for name in names:
+            self.derived(name)
+
+
+def _load_dataset() -> Dataset:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(ARTIFACTS)) as pool:
+        results = dict(zip(ARTIFACTS, pool.map(_read, ARTIFACTS)))
+    stats = {name: info for name, (_, info) in results.items()}
+    stats['total_load_seconds'] = round(time.perf_counter() - start, 3)
+    # ru_maxrss is reported in kilobytes on Linux
+    stats['process_max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    dataset = Dataset({name: frame for name, (frame, _) in results.items()}, stats)
+    print(f"Datasets loaded ({dataset.version}): {stats}")
+    return dataset
+
+
+def derive(name:str):
+    """
+    Register a function that builds a structure from a `Dataset`. It runs once
+    per dataset version, on first use. On a reload, everything already built
+    on the old version is rebuilt ahead of the swap.
+    """
+    def register(func):
+        _builders[name] = func
+        return func
+    return register
+
+
+def on_reload(func):
+    """Register `func(old, new)` to be called after a new dataset is swapped in."""
+    _reload_hooks.append(func)
+    return func
+
+
+def on_load(func):
+    """
+    Register `func(dataset)` to be run in a background thread each time a
+    dataset becomes current, the first load included.
+    """
+    _load_hooks.append(func)
+    return func
+
+
+def _run_load_hooks(dataset:Dataset) -> None:
+    for hook in _load_hooks:
+        threading.Thread(target=hook, args=(dataset,), daemon=True, name=hook.__name__).start()
+
+
+def load() -> Dataset:
+    """
+    Load every artifact concurrently. Only the first call in a process does
+    any work; it also starts the background refresher.
+    """
+    global _current
+    if _current is not None:
+        return _current
+    with _load_lock:
+        if _current is None:
+            _current = _load_dataset()
+            _run_load_hooks(_current)
+            if REFRESH_SECONDS > 0:
+                threading.Thread(target=_refresh_loop, daemon=True, name='dataset-refresh').start()
+    return _current
+
+
+def current() -> Dataset:
+    return load()
+
+
+def get(name:str, consumer:str=None) -> pd.DataFrame:
+    """Read-only view of an artifact in the current dataset, see `Dataset.get`."""
+    return current().get(name, consumer)
+
+
+def scan(name:str, columns:list=None, filters:list=None) -> pd.DataFrame:
+    """Filtered read of an artifact in the current dataset, see `Dataset.scan`."""
+    return current().scan(name, columns, filters)
+
+
+def stats() -> dict:
+    """Load time and resident size of each artifact."""
+    return dict(current().stats)
+
+
+def reload(force:bool=False) -> bool:
+    """
+    Swap in a new dataset if any artifact generation changed. Returns whether
+    a swap happened.
+    """
+    global _current
+    old = current()
+    if not force:
+        changed = [
+            name for name in ARTIFACTS
+            if cache_for(_remote(name)).version(_remote(name)) != old.stats[name]['version']
+        ]
+        if not changed:
+            return False
+    new = _load_dataset()
+    if new.version == old.version:
+        return False
+    # Pages visited on the old version are ready before anyone sees the new one
+    new.previous = old
+    try:
+        new.build(old.built())
+    finally:
+        new.previous = None
+    with _load_lock:
+        _current = new
+    for hook in _reload_hooks:
+        hook(old, new)
+    _run_load_hooks(new)
+    print(f"Dataset {old.version} replaced by {new.version}")
+    return True
+
+
+def _refresh_loop() -> None:
+    while True:
+        time.sleep(REFRESH_SECONDS)
+        try:
+            reload()
+        except Exception as e:
+            print(f"Dataset refresh failed, keeping {_current.version}: {e!r}")
@@ -0,0 +1,61 @@
+"""
+CSV export of the reviews of one vendor and/or an order date range.
+
+The export reads the cached parquet file through `data.scan` rather than the
+frame in memory: the vendor and date filters are pushed down to the row
+groups, so only the part of the file that can match is decoded, and columns
+no page keeps in memory (`order_id`) come along.
+
+Served at `/reviews.csv?vendor_id=...&start_date=...&end_date=...`; see `url`.
+
+Author: Derrick Lewis
+"""
+from urllib.parse import urlencode
+
+import pandas as pd
+from flask import Response, abort, request
+from werkzeug.utils import secure_filename
+
+from apps import data
+from main import server
+
+COLUMNS = ['order_id', 'vendor_id', 'order_date', 'item_id', 'item_rating', 'sentiment', 'consumer_comment']
+
+
+def filters(vendor_id:str=None, start_date:str=None, end_date:str=None) -> list:
+    """`data.scan` filters of one vendor and the order days from `start_date` to `end_date`, both included"""
+    conditions = []
+    if vendor_id:
+        conditions.append(('vendor_id', '==', str(vendor_id)))
+    if start_date:
+        conditions.append(('order_date', '>=', pd.Timestamp(start_date[:10])))
+    if end_date:
+        conditions.append(('order_date', '<', pd.Timestamp(end_date[:10]) + pd.Timedelta(days=1)))
+    return conditions
+
+
+def url(vendor_id:str=None, start_date:str=None, end_date:str=None) -> str:
+    """Address of the export, or None when nothing narrows it down."""
+    args = {'vendor_id': vendor_id, 'start_date': start_date and start_date[:10], 'end_date': end_date and end_date[:10]}
+    args = {key: value for key, value in args.items() if value}
+    return f'/reviews.csv?{urlencode(args)}' if args else None
+
+
+@server.route('/reviews.csv')
+def serve_csv():
+    args = {key: request.args.get(key) or None for key in ('vendor_id', 'start_date', 'end_date')}
+    if not any(args.values()):
+        # the whole file is not an export
+        abort(400)
+    try:
+        conditions = filters(**args)
+    except ValueError:
+        abort(400)
+    ds = data.current()
+    reviews = ds.scan('reviews', COLUMNS, conditions)
+    name = secure_filename('-'.join(value for value in args.values() if value))
+    return Response(
+        reviews.to_csv(index=False),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="reviews-{name}.csv"'},
+    )
@@ -0,0 +1,145 @@
+"""
+All-vendor figures, built once per dataset version.
+
+Both pages open on every vendor, and the dashboard's callbacks answer
+`vendor_id=None` with the same figures its layout already shows. A figure
+registered with `register` is built and encoded (see `apps.serialize`) once
+per dataset version; layouts and callbacks both take the encoded bytes from
+`get`. Every registered figure is built in the background when a dataset
+loads, so the first visit doesn't pay for them either.
+
+The plots the two pages share live here too.
+
+Author: Derrick Lewis
+"""
+import numpy as np
+import orjson
+import pandas as pd
+import plotly.graph_objects as go
+
+from apps import aggregates, data, serialize
+
+_names = []
+
+
+def register(name:str):
+    """Register `func(dataset) -> go.Figure` as the all-vendor figure `name`."""
+    def decorator(func):
+        data.derive(f'figure:{name}')(lambda ds: serialize.encoded(func(ds)))
+        _names.append(name)
+        return func
+    return decorator
+
+
+def get(ds:data.Dataset, name:str) -> orjson.Fragment:
+    """The encoded figure `name` of `ds`, ready for a layout or a callback output."""
+    return ds.derived(f'figure:{name}')
+
+
+@data.on_load
+def prebuild(ds:data.Dataset) -> None:
+    ds.build([f'figure:{name}' for name in _names])
+
+# ---------------------------------------------------------------------
+# Python functions
+# ---------------------------------------------------------------------
+
+def plot_weekly_rating(df_week:pd.DataFrame) -> go.Figure:
+    """Bar chart of a weekly `sum`/`count`/`mean` frame from `aggregates.weekly`"""
+    df_week.columns = ['positive_ratings', 'total_reviews', 'avg_rating']
+    overal_ave = df_week.avg_rating.mean()
+    fig = go.Figure()
+    fig.add_trace(
+        go.Bar(
+            x=df_week.index,
+            y=df_week['avg_rating'],
+            name='Average Rating',
+            hovertemplate=
+            '<i>Week Starting</i>: %{x}<br>' +
+            '<b>Average Rating</b>: %{y:.2%}<br><extra></extra>',
+        )
+    )
+    # add a horizontal line for the overall mean
+    fig.add_shape(
+        type='line',
+        x0=df_week.index[0],
+        y0=overal_ave,
+        x1=df_week.index[-1],
+        y1=overal_ave,
+        line=dict(
+            color='red',
+            width=2,
+            dash='dash'
+        )
+    )
+    fig.add_annotation(
+        x=df_week.index[-1],
+        y=overal_ave,
+        text=f"Overall Average Rating: {overal_ave:.2%}"
+    )
+    fig.update_yaxes(tickformat='.0%')
+    fig.update_layout(
+        title="Weekly Ratings",
+        xaxis_title='Week',
+        yaxis_title='Average Rating'
+    )
+    return fig
+
+def plot_sentiment(histogram:pd.Series) -> go.Figure:
+    """Bars of a `sentiment_histogram` row: counts on `aggregates.SENTIMENT_EDGES` and the mean"""
+    edges = aggregates.SENTIMENT_EDGES
+    counts = histogram.iloc[:len(edges) - 1].to_numpy(dtype='int64')
+    sent_mean = histogram['mean']
+    fig = go.Figure(
+            go.Bar(
+                x=((edges[:-1] + edges[1:]) / 2).round(3),
+                y=counts,
+                width=round(edges[1] - edges[0], 3),
+                customdata=np.stack([edges[:-1], edges[1:]], axis=1).round(3),
+                name='Sentiment',
+                hovertemplate=
+                '<b>Sentiment</b>: %{customdata[0]} to %{customdata[1]}<br>' +
+                '<b>Count</b>: %{y}<extra></extra>',
+                )
+        )
+    fig.add_shape(
+        type='line',
+        x0=sent_mean,
+        y0=0,
+        x1=sent_mean,
+        y1=counts.max(),
+        line=dict(
+            color='red',
+            width=2,
+            dash='dash'
+        )
+    )
+    fig.add_annotation(
+        x=sent_mean,
+        y=counts.max(),
+        text=f'Mean Sentiment: {sent_mean:.2f}'
+    )
+    fig.update_layout(
+        title="Sentiment Distribution<br><sub>Greater than 0 is positive, less than 0 is negative</sub>",
+        xaxis=dict(title="Sentiment"),
+        yaxis=dict(title="Count")
+    )
+    return fig
+
+# ---------------------------------------------------------------------
+# Shared all-vendor figures
+# ---------------------------------------------------------------------
+
+@register('weekly_rating')
+def weekly_rating(ds:data.Dataset) -> go.Figure:
+    return plot_weekly_rating(aggregates.weekly(ds, 'item_rating'))
+
+
+@register('weekly_sentiment')
+def weekly_sentiment(ds:data.Dataset) -> go.Figure:
+    return plot_weekly_rating(aggregates.weekly(ds, 'sentiment'))
+
+
+@register('sentiment')
+def sentiment(ds:data.Dataset) -> go.Figure:
+    return plot_sentiment(ds.derived('sentiment_histogram').loc['all'])
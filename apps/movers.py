@@ -0,0 +1,117 @@
+"""
+Movers and shakers: vendors whose rating changed most between two windows.
+
+`Movers` lays a vendor x period cube (see `apps.aggregates`) out as dense
+vendor-by-period arrays of sums and counts and keeps their running totals
+along the periods. The totals of any window of consecutive weeks or months
+are then the difference of two columns, and the change between two windows
+is computed for every vendor at once.
+
+On a reload the cube is updated rather than rebuilt (see `Cube.update`), and
+the running totals of the periods whose cells it kept are taken from the
+previous version's `Movers`, lined up with this version's vendors. Only the
+periods from the first changed one on are summed again.
+
+Author: Derrick Lewis
+"""
+import numpy as np
+import pandas as pd
+
+from apps import aggregates, data
+
+
+class Movers:
+
+    def __init__(self, cube:aggregates.Cube, measure:str='item_rating', previous:'Movers'=None):
+        index = cube.cells.index
+        self.vendors = pd.Index(index.levels[0].astype(str), name=index.names[0])
+        self.periods = pd.DatetimeIndex(index.levels[1].astype('datetime64[ns]'), name=index.names[1])
+        shape = (len(self.vendors), len(self.periods))
+        self.sums, self.counts = np.zeros(shape), np.zeros(shape, dtype=np.int64)
+        self.sums[index.codes[0], index.codes[1]] = cube.cells[f'{measure}_sum'].to_numpy()
+        self.counts[index.codes[0], index.codes[1]] = cube.cells[f'{measure}_count'].to_numpy()
+
+        # running totals with a leading column of zeros; column j sums periods before j
+        self.cum_sums = np.zeros((shape[0], shape[1] + 1))
+        self.cum_counts = np.zeros((shape[0], shape[1] + 1), dtype=np.int64)
+        self.reused = self._kept_periods(cube, previous)
+        start = self.reused
+        if start:
+            # vendors new to this version have no cells in the kept periods
+            rows = previous.vendors.get_indexer(self.vendors)
+            known = rows >= 0
+            self.cum_sums[known, :start + 1] = previous.cum_sums[rows[known], :start + 1]
+            self.cum_counts[known, :start + 1] = previous.cum_counts[rows[known], :start + 1]
+        self.cum_sums[:, start + 1:] = self.cum_sums[:, [start]] + np.cumsum(self.sums[:, start:], axis=1)
+        self.cum_counts[:, start + 1:] = self.cum_counts[:, [start]] + np.cumsum(self.counts[:, start:], axis=1)
+
+    def _kept_periods(self, cube:aggregates.Cube, previous:'Movers') -> int:
+        """Number of leading periods whose cells `cube` kept from the cube of `previous`."""
+        if previous is None or not cube.reused:
+            return 0
+        last_kept = cube.fingerprint.index[cube.reused - 1]
+        n = self.periods.get_loc(pd.Timestamp(last_kept)) + 1
+        return n if self.periods[:n].equals(previous.periods[:n]) else 0
+
+    def window(self, first, last) -> tuple:
+        """
+        Per-vendor `(sums, counts)` over the periods from `first` to `last`,
+        both included. Periods the data does not have count as empty.
+        """
+        start = self.periods.searchsorted(pd.Timestamp(first), side='left')
+        end = max(start, self.periods.searchsorted(pd.Timestamp(last), side='right'))
+        return self.cum_sums[:, end] - self.cum_sums[:, start], self.cum_counts[:, end] - self.cum_counts[:, start]
+
+    def latest(self, n:int) -> tuple:
+        """
+        `(before, after)` windows: the last `n` periods and the `n` before
+        them, or None when there are fewer than two periods to compare.
+        """
+        if len(self.periods) < 2:
+            return None
+        n = max(1, min(n, len(self.periods) // 2))
+        p = self.periods
+        return (p[-2 * n], p[-n - 1]), (p[-n], p[-1])
+
+    def first_and_last(self) -> tuple:
+        """`(before, after)` windows of the first and the last period, or None with fewer than two."""
+        if len(self.periods) < 2:
+            return None
+        p = self.periods
+        return (p[0], p[0]), (p[-1], p[-1])
+
+    def change(self, before:tuple, after:tuple, min_reviews:int=1) -> pd.DataFrame:
+        """
+        Mean of each vendor over the `after` window, over the `before` window
+        and the change between them, for the vendors with at least
+        `min_reviews` reviews in both. Windows are `(first, last)` periods.
+        """
+        before_sums, before_counts = self.window(*before)
+        after_sums, after_counts = self.window(*after)
+        keep = (before_counts >= max(min_reviews, 1)) & (after_counts >= max(min_reviews, 1))
+        moved = pd.DataFrame({
+            'before': before_sums[keep] / before_counts[keep],
+            'after': after_sums[keep] / after_counts[keep],
+            'reviews': before_counts[keep] + after_counts[keep],
+        }, index=self.vendors[keep])
+        moved['change'] = moved['after'] - moved['before']
+        return moved
+
+
+def winners_and_losers(moved:pd.DataFrame, n:int=10) -> dict:
+    """`n` biggest rises and falls of a `Movers.change` frame, as table rows."""
+    def ranked(ascending):
+        top = moved['change'].sort_values(ascending=ascending, kind='stable').head(n).reset_index()
+        top.columns = ['Vendor ID', 'Change in Rating']
+        return top
+    return {'winners': ranked(False), 'losers': ranked(True)}
+
+
+@data.derive('movers_week')
+def movers_week(ds:data.Dataset) -> Movers:
+    return Movers(ds.derived('vendor_week'), previous=ds.built_before('movers_week'))
+
+
+@data.derive('movers_month')
+def movers_month(ds:data.Dataset) -> Movers:
+    return Movers(ds.derived('vendor_month'), previous=ds.built_before('movers_month'))
@@ -2,25 +2,23 @@
 
 Author: Derrick Lewis
 """
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.io as pio
 import dash_bootstrap_components as dbc
-from dash import dcc, html
+from dash import ClientsideFunction, Patch, ctx, dcc, html, no_update
 import dash_ag_grid as dag
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 from dotenv import load_dotenv
-from apps.tables import columnDefs, defaultColDef
+from apps import aggregates, data, export, figures, movers, row_model, serialize, wordclouds
+from apps.tables import changeColumnDefs, columnDefs, defaultColDef, leaderboardColumnDefs
 
 from plotly_theme_light import plotly_light
 
 from main import app
 
-from collections import Counter
-from io import BytesIO
-from wordcloud import WordCloud
-import base64
-
 pio.templates["plotly_light"] = plotly_light
 pio.templates.default = "plotly_light"
 load_dotenv()
@@ -31,106 +29,94 @@ DATA_PADDING = 5
 TABLE_PADDING = 1
 FONTSIZE = 12
 
-# ---------------------------------------------------------------------
-# Load data
-# ---------------------------------------------------------------------
+WORDCLOUD_POLL_MS = 500
+GRID_BLOCK_SIZE = 100
 
-df = pd.read_parquet(
-    'gs://dashapp_project_assests/df.parquet',
-)
+# Movers and Shakers: the last `window` weeks or months against the ones before
+MOVERS_PERIOD = 'week'
+MOVERS_WINDOW = 1
+MOVERS_MIN_REVIEWS = 3
 
-# Get the mean rating for last week
-last_week = df.week.max()
-df_last_week = df[df['week'] == last_week]
-mean_last_week = df_last_week.item_rating.mean()
-
-# Get the mean rating for the week before
-week_before = df.week.unique()[-2]
-df_week_before = df[df['week'] == week_before]
-mean_week_before = df_week_before.item_rating.mean()
-
-# Calculate WoW change
-delta_WoW = mean_last_week - mean_week_before
+# ---------------------------------------------------------------------
+# Derived data
+# ---------------------------------------------------------------------
 
-# Calculate difference from mean
-delta_mean = mean_last_week - df.item_rating.mean()
+@data.derive('kpis')
+def kpis(ds:data.Dataset) -> pd.Series:
+    """All-vendor ratings for the header labels"""
+    weeks = ds.derived('vendor_week').rollup(['week_for_plot'])
+    return aggregates.week_over_week(weeks).loc['all']
+
+
+@data.derive('leaderboard')
+def leaderboard(ds:data.Dataset) -> list:
+    """Row data of the vendor leaderboard, worst week-over-week change first"""
+    board = ds.derived('vendor_kpis').sort_values('delta_WoW', na_position='last').reset_index()
+    board['vendor_id'] = board['vendor_id'].astype(str)
+    board['last_week_start'] = board['last_week_start'].astype('datetime64[ns]').dt.strftime('%Y-%m-%d')
+    return board[[col['field'] for col in leaderboardColumnDefs]].to_dict('records')
+
+
+@data.derive('vendor_aggregates')
+def vendor_aggregates(ds:data.Dataset):
+    """
+    Weekly means, KPIs, sentiment histogram and most reviewed items of every
+    vendor and of 'all', shipped once in the layout so the charts redraw in
+    the browser (see assets/dashboard.js). Means are rounded to the 4 decimals the charts show.
+    """
+    weeks = ds.derived('vendor_week')
+    kpis = ds.derived('vendor_kpis')[['mean_last_week', 'delta_WoW', 'delta_mean']]
+    kpis.loc['all'] = ds.derived('kpis')[kpis.columns]
+    kpis = kpis.astype('float64').round(4)
+    histogram = ds.derived('sentiment_histogram')
+    bins = histogram.drop(columns='mean').astype('int32')
+    top_items = ds.derived('top_items')
+
+    def means(cells:pd.DataFrame) -> dict:
+        return {m: (cells[f'{m}_sum'] / cells[f'{m}_count']).round(4).to_numpy(dtype='float32')
+                for m in aggregates.MEASURES}
+
+    def series(vendor_id:str, week_codes:np.ndarray, means:dict, kpi:np.ndarray) -> dict:
+        items = top_items[vendor_id]
+        return {'week': week_codes, **means, 'kpis': kpi,
+                'sentiment_bins': bins.loc[vendor_id].to_numpy(),
+                'sentiment_mean': round(float(histogram.at[vendor_id, 'mean']), 4),
+                'items': {'item_id': items['item_id'].astype(str).tolist(),
+                          'sum': items['sum'].to_numpy(), 'count': items['count'].to_numpy()}}
+
+    # cube cells are sorted by vendor; slice each vendor's share
+    vendor_ids = weeks.cells.index.levels[0]
+    bounds = np.searchsorted(weeks.cells.index.codes[0], np.arange(len(vendor_ids) + 1))
+    week_codes, cell_means = weeks.cells.index.codes[1].astype('int16'), means(weeks.cells)
+    vendor_kpis = kpis.reindex(vendor_ids).to_numpy()
+    vendors = {
+        str(vendor_id): series(str(vendor_id), week_codes[start:end],
+                               {m: v[start:end] for m, v in cell_means.items()}, vendor_kpis[i])
+        for i, (vendor_id, start, end) in enumerate(zip(vendor_ids, bounds[:-1], bounds[1:]))
+        if end > start
+    }
+    totals = weeks.rollup(['week_for_plot']).cells
+    vendors['all'] = series('all', np.arange(len(totals), dtype='int16'), means(totals), kpis.loc['all'].to_numpy())
+    return serialize.encoded({'weeks': weeks.cells.index.levels[1].astype(str).tolist(), 'vendors': vendors})
 
 
 # ---------------------------------------------------------------------
 # Python functions
 # ---------------------------------------------------------------------
 
-def plot_weekly_rating(dff:pd.DataFrame, feature:str) -> go.Figure:   
-    df_week = dff.groupby('week_for_plot').agg({feature: ('sum', 'count', 'mean')})
-    df_week.columns = ['positive_ratings', 'total_reviews', 'avg_rating']
-    overal_ave = df_week.avg_rating.mean()
-    fig = go.Figure()
-    fig.add_trace(
-        go.Bar(
-            x=df_week.index,
-            y=df_week['avg_rating'],
-            name='Average Rating',
-            hovertemplate=
-            '<i>Week Starting</i>: %{x}<br>' +
-            '<b>Average Rating</b>: %{y:.2%}<br><extra></extra>',
-        )
-    )
-    # add a horizontal line for the overall mean
-    fig.add_shape(
-        type='line',
-        x0=df_week.index[0],
-        y0=overal_ave,
-        x1=df_week.index[-1],
-        y1=overal_ave,
-        line=dict(
-            color='red',
-            width=2,
-            dash='dash'
-        )
-    )
-    fig.add_annotation(
-        x=df_week.index[-1],
-        y=overal_ave,
-        text=f"Overall Average Rating: {overal_ave:.2%}"
-    )
-    fig.update_yaxes(tickformat='.0%')
-    fig.update_layout(
-        title="Weekly Ratings",
-        xaxis_title='Week',
-        yaxis_title='Average Rating'
-    )
-    return fig
-
-def plot_wordcloud(data:pd.Series) -> BytesIO:
-    freq = Counter([item for sublist in data.to_list() for item in sublist])
-    wc = WordCloud(
-        background_color='white',
-        width=1000,
-        height=500
-    )
-    wc.fit_words(freq)
-    return wc.to_image()
-
-def make_word_cloud_image(dff):
-    img = BytesIO()
-    plot_wordcloud(data=dff.tokenized).save(img, format='PNG')
-    return 'data:image/png;base64,{}'.format(base64.b64encode(img.getvalue()).decode())
-
-def make_items_plot(dff, vendor_id=None):
-    if vendor_id:
-        dff = dff[dff['vendor_id'] == vendor_id]
-    df_item = dff.groupby('item_id').agg({'item_rating': ('sum', 'count', 'mean')}).sort_values(('item_rating', 'count'), ascending=False).head(20)
+def make_items_plot(df_item:pd.DataFrame) -> go.Figure:
+    """Scatter of a `top_items` frame: total positive ratings against the average rating"""
     # Scale marker size based on number of ratings
-    marker_size = (df_item[('item_rating', 'count')] / df_item[('item_rating', 'count')].max()) * 40 + 10
+    marker_size = (df_item['count'] / df_item['count'].max()) * 40 + 10
 
     fig = go.Figure()
     fig.add_trace(
         go.Scatter(
-            x=df_item[('item_rating', 'sum')],
-            y=df_item[('item_rating', 'mean')],
+            x=df_item['sum'],
+            y=df_item['mean'],
             name='Average Rating',
             mode='markers',
-            text=df_item.index,
+            text=df_item['item_id'].astype(str),
             hovertemplate=
             '<i>Total Ratings</i>: %{x}<br>' +
             '<b>Average Rating</b>: %{y:.2%}<br>' +
@@ -142,438 +128,665 @@ def make_items_plot(dff, vendor_id=None):
         )
     )
     fig.update_layout(
-        title='Ratings for the 20 Most Reviewed Items',
+        title=f'Ratings for the {aggregates.TOP_ITEMS} Most Reviewed Items',
         xaxis_title='Total Ratings',
         yaxis_title='Average Rating'
     )
     fig.update_yaxes(tickformat='.0%')
     return fig
 
-def plot_sentiment(dff):
-    sent_mean = dff['sentiment'].mean()
-    fig = go.Figure(
-            go.Histogram(
-                x=dff['sentiment'],
-                name='Sentiment'
-                )
-        )
-    fig.add_shape(
-        type='line',
-        x0=sent_mean,
-        y0=0,
-        x1=sent_mean,
-        y1=dff['sentiment'].value_counts().max(),
-        line=dict(
-            color='red',
-            width=2,
-            dash='dash'
-        )
-    )
-    fig.add_annotation(
-        x=sent_mean,
-        y=dff['sentiment'].value_counts().max(),
-        text=f'Mean Sentiment: {sent_mean:.2f}'
-    )
-    fig.update_layout(
-        title="Sentiment Distribution<br><sub>Greater than 0 is positive, less than 0 is negative</sub>",
-        xaxis=dict(title="Sentiment"),
-        yaxis=dict(title="Count")
-    )
+def plot_item_trend(ds:data.Dataset, item_id:str, vendor_id:str=None) -> go.Figure:
+    """Weekly ratings of one item, from the item x week cubes"""
+    fig = figures.plot_weekly_rating(aggregates.item_weekly(ds, 'item_rating', item_id, vendor_id))
+    fig.update_layout(title=f"Weekly Ratings of Item {item_id}" + (f" from Vendor {vendor_id}" if vendor_id else ""))
     return fig
 
+def item_trend_patch(ds:data.Dataset, item_id:str, vendor_id:str=None) -> Patch:
+    """
+    What changes in the `plot_item_trend` figure for another item or vendor:
+    the bars, the mean line, its annotation and the title
+    """
+    source = f" from Vendor {vendor_id}" if vendor_id else ""
+    patch = Patch()
+    try:
+        df_week = aggregates.item_weekly(ds, 'item_rating', item_id, vendor_id)
+    except KeyError:
+        patch['data'][0].update({'x': [], 'y': []})
+        patch['layout']['shapes'][0]['visible'] = False
+        patch['layout']['annotations'][0]['visible'] = False
+        patch['layout']['title']['text'] = f"No reviews of Item {item_id}{source}"
+        return patch
+    weeks = df_week.index.astype(str)
+    overal_ave = df_week['mean'].mean()
+    patch['data'][0].update({'x': weeks, 'y': df_week['mean'].to_numpy()})
+    patch['layout']['shapes'][0].update({'visible': True, 'x0': weeks[0], 'x1': weeks[-1], 'y0': overal_ave, 'y1': overal_ave})
+    patch['layout']['annotations'][0].update({'visible': True, 'x': weeks[-1], 'y': overal_ave,
+                                              'text': f"Overall Average Rating: {overal_ave:.2%}"})
+    patch['layout']['title']['text'] = f"Weekly Ratings of Item {item_id}{source}"
+    return patch
+
+def _span(first:pd.Timestamp, last:pd.Timestamp) -> str:
+    return f"{first:%Y-%m-%d}" if first == last else f"{first:%Y-%m-%d} to {last:%Y-%m-%d}"
+
+def movers_rows(ds:data.Dataset, period:str, window:int, min_reviews:int) -> tuple:
+    """Label and winners/losers row data of the last `window` periods against the `window` before"""
+    engine = ds.derived(f'movers_{period}')
+    windows = engine.latest(window)
+    if windows is None:
+        return f"Fewer than two {period}s of reviews, nothing to compare", [], []
+    before, after = windows
+    moved = engine.change(before, after, min_reviews)
+    tables = movers.winners_and_losers(moved)
+    label = f"{_span(*after)} against {_span(*before)} ({len(moved):,} vendors with {min_reviews}+ reviews in both)"
+    return label, tables['winners'].to_dict('records'), tables['losers'].to_dict('records')
+
+@figures.register('items')
+def items(ds:data.Dataset) -> go.Figure:
+    return make_items_plot(ds.derived('top_items')['all'])
+
+@figures.register('item_trend')
+def item_trend(ds:data.Dataset) -> go.Figure:
+    """Trend of the most reviewed item, shown until another one is picked"""
+    return plot_item_trend(ds, ds.derived('top_items')['all']['item_id'].iloc[0])
+
 # ---------------------------------------------------------------------
 # Create app layout
 # ---------------------------------------------------------------------
 
-layout = dbc.Container([
-    dbc.Row([
-        dbc.Col(
-            [
-                dcc.Markdown(id='intro',
-                children = """
-                ---
-                # Dashboard
-                """,
-                className='md')
-            ]),
-        dbc.Col(
-           [
-                dcc.Markdown(id='intro',
-                children = """
-                ---
-                Choose a Vendor ID to see the ratings for that vendor.
-                """,
-                className='md',
+@data.derive('dashboard_layout_json')
+def encoded_layout(ds:data.Dataset):
+    """The layout, encoded once per dataset version rather than on every visit"""
+    return serialize.encoded(ds.derived('dashboard_layout'))
+
+
+@data.derive('dashboard_layout')
+def make_layout(ds:data.Dataset) -> dbc.Container:
+    df = ds.get('reviews', consumer='dashboard')
+    kpi = ds.derived('kpis')
+    movers_label, winners, losers = movers_rows(ds, MOVERS_PERIOD, MOVERS_WINDOW, MOVERS_MIN_REVIEWS)
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col(
+                [
+                    dcc.Markdown(id='intro',
+                    children = """
+                    ---
+                    # Dashboard
+                    """,
+                    className='md')
+                ]),
+            dbc.Col(
+               [
+                    dcc.Markdown(id='intro',
+                    children = """
+                    ---
+                    Choose a Vendor ID to see the ratings for that vendor.
+                    """,
+                    className='md',
+                    ),
+                    dcc.Dropdown(
+                        id='vendor_id',
+                        placeholder='All Vendors',
+                        options=[{'label': i, 'value': i} for i in df.vendor_id.value_counts().index],
+                        value=None
+                    ),
+                    html.Br(),
+                    # add reset button to see all vendors
+                    dbc.Button('Reset', 
+                               id='reset',
+                               style={
+                                        'background-color': 'rgba(0, 203, 166, 0.7)',
+                                        'border': 'none',
+                                        'color': 'white',
+                                        'padding': '10px',
+                                        'margin-top': '5px',
+                                        'margin-bottom': '10px',
+                                        'text-align': 'center',
+                                        'text-decoration': 'none',
+                                        'font-size': '12px',
+                                        'border-radius': '26px'
+                                    }
+                    )
+               ]),
+        
+        ]),
+        html.Br(),
+        dbc.Row(
+                dbc.Col([
+                    dcc.Markdown(
+                        children = """
+                        ---
+                        """,
+                        className='md'),
+                    html.H2(f'Current Rating - Week of {kpi["last_week_start"].strftime("%Y-%m-%d")}: ',
+                            style={
+                                'font-weight': 'light',
+                                'color': 'grey',
+                                'text-align': 'center',
+                                'font-size': 24,
+                            }
+                    ),
+                    html.H1(id='mean_agg_rating',
+                            children=f"{kpi['mean_last_week']:.1%}",
+                            style={
+                                'font-weight': 'light',
+                                'font-size': 36,
+                                'padding': 0,
+                                'textAlign': 'center',
+                                'margin-bottom': 0
+                            }
+                    ), 
+            
+                ],
+                    align="center", width=6
                 ),
-                dcc.Dropdown(
-                    id='vendor_id',
-                    placeholder='All Vendors',
-                    options=[{'label': i, 'value': i} for i in df.vendor_id.value_counts().index],
-                    value=None
+            justify='center', align='center', style={'padding-top': 0}
+        ),
+        html.Br(),
+        dbc.Row([
+                dbc.Col(width=1),
+                dbc.Col(
+                    [
+                    html.H2('Change WoW: ',
+                            style={
+                                'font-weight': 'light',
+                                'color': 'grey',
+                                'font-size': 24,
+                                'textAlign': 'center'
+                            }),
+                    html.H1(id='delta_WoW',
+                            children=f"{kpi['delta_WoW']:.2%}",
+                            style={
+                                'font-weight': 'light',
+                                'font-size': 36,
+                                'padding': 0,
+                                'textAlign': 'center',
+                                'margin-bottom': 0
+                            }),
+                    ],
+                    align="center", width=5,
                 ),
-                html.Br(),
-                # add reset button to see all vendors
-                dbc.Button('Reset', 
-                           id='reset',
-                           style={
-                                    'background-color': 'rgba(0, 203, 166, 0.7)',
-                                    'border': 'none',
-                                    'color': 'white',
-                                    'padding': '10px',
-                                    'margin-top': '5px',
-                                    'margin-bottom': '10px',
-                                    'text-align': 'center',
-                                    'text-decoration': 'none',
-                                    'font-size': '12px',
-                                    'border-radius': '26px'
-                                }
+                dbc.Col([
+                    html.H2('Difference from Mean: ',
+                            style={
+                                'font-weight': 'light',
+                                'color': 'grey',
+                                'font-size': 24,
+                                'text-align': 'center'
+                            }),
+                    html.H1(id='delta_mean',
+                            children=f"{kpi['delta_mean']:.2%}",
+                            style={
+                                'font-weight': 'light',
+                                'font-size': 36,
+                                'padding': 0,
+                                'textAlign': 'center',
+                                'margin-bottom': 0
+                            })
+                ], 
+                align="center", width=5
                 )
-           ]),
-        
-    ]),
-    html.Br(),
-    dbc.Row(
+        ]),
+        html.Br(),
+        dbc.Row(
             dbc.Col([
                 dcc.Markdown(
                     children = """
                     ---
+                    ### Vendor Leaderboard
+                    Sorted by the largest week-over-week drop. Click a row to select the vendor.
                     """,
                     className='md'),
-                html.H2(f'Current Rating - Week of {df["week_for_plot"].max().strftime("%Y-%m-%d")}: ',
-                        style={
-                            'font-weight': 'light',
-                            'color': 'grey',
-                            'text-align': 'center',
-                            'font-size': 24,
-                        }
-                ),
-                html.H1(id='mean_agg_rating',
-                        children=f"{mean_last_week:.1%}",
-                        style={
-                            'font-weight': 'light',
-                            'font-size': 36,
-                            'padding': 0,
-                            'textAlign': 'center',
-                            'margin-bottom': 0
-                        }
-                ), 
-            
-            ],
-                align="center", width=6
+                dag.AgGrid(
+                    id='leaderboard',
+                    rowData=ds.derived('leaderboard'),
+                    className="ag-theme-material",
+                    columnDefs=leaderboardColumnDefs,
+                    columnSize="responsiveSizeToFit",
+                    defaultColDef=defaultColDef,
+                    dashGridOptions={"rowSelection": "single",
+                                     "pagination": True,
+                                     "paginationPageSize": 10},
+                    ),
+            ])
+        ),
+        html.Br(),
+        dbc.Row(
+            dbc.Col([
+                dcc.Markdown(
+                    children = """
+                    ---
+                    ### Movers and Shakers
+                    Vendors whose average rating changed most over the latest weeks or months.
+                    """,
+                    className='md'),
+                dbc.Row([
+                    dbc.Col(
+                        dcc.RadioItems(
+                            id='movers-period',
+                            options=[{'label': ' Weeks', 'value': 'week'},
+                                     {'label': ' Months', 'value': 'month'}],
+                            value=MOVERS_PERIOD,
+                            inline=True,
+                            inputStyle={'margin-left': '10px'}),
+                        width=4),
+                    dbc.Col(
+                        dcc.Slider(
+                            id='movers-window',
+                            min=1, max=4, step=1,
+                            value=MOVERS_WINDOW,
+                            marks={n: str(n) for n in range(1, 5)}),
+                        width=5),
+                    dbc.Col(
+                        dcc.Input(
+                            id='movers-min-reviews',
+                            type='number',
+                            min=1,
+                            value=MOVERS_MIN_REVIEWS,
+                            debounce=True,
+                            placeholder='Min. reviews',
+                            style={'width': '100%'}),
+                        width=3),
+                ]),
+                html.Small(movers_label, id='movers-label', className='text-muted'),
+            ])
+        ),
+        dbc.Row([
+            dbc.Col([
+                dcc.Markdown(
+                    children = """
+                    ##### Getting Better
+                    """,
+                    className='md'),
+                dag.AgGrid(
+                    id='movers-winners',
+                    rowData=winners,
+                    className="ag-theme-material",
+                    columnDefs=changeColumnDefs,
+                    columnSize="responsiveSizeToFit",
+                    defaultColDef=defaultColDef,
+                    style={'height': '300px', 'width': '100%'},
+                    ),
+                ],
+                width=6
             ),
-        justify='center', align='center', style={'padding-top': 0}
-    ),
-    html.Br(),
-    dbc.Row([
-            dbc.Col(width=1),
-            dbc.Col(
-                [
-                html.H2('Change WoW: ',
-                        style={
-                            'font-weight': 'light',
-                            'color': 'grey',
-                            'font-size': 24,
-                            'textAlign': 'center'
-                        }),
-                html.H1(id='delta_WoW',
-                        children=f"{delta_WoW:.2%}",
-                        style={
-                            'font-weight': 'light',
-                            'font-size': 36,
-                            'padding': 0,
-                            'textAlign': 'center',
-                            'margin-bottom': 0
-                        }),
+            dbc.Col([
+                dcc.Markdown(
+                    children = """
+                    ##### Having Trouble
+                    """,
+                    className='md'),
+                dag.AgGrid(
+                    id='movers-losers',
+                    rowData=losers,
+                    className="ag-theme-material",
+                    columnDefs=changeColumnDefs,
+                    columnSize="responsiveSizeToFit",
+                    defaultColDef=defaultColDef,
+                    style={'height': '300px', 'width': '100%'},
+                    ),
                 ],
-                align="center", width=5,
+                width=6
             ),
+        ]),
+        html.Br(),
+        dbc.Row(
             dbc.Col([
-                html.H2('Difference from Mean: ',
-                        style={
-                            'font-weight': 'light',
-                            'color': 'grey',
-                            'font-size': 24,
-                            'text-align': 'center'
-                        }),
-                html.H1(id='delta_mean',
-                        children=f"{delta_mean:.2%}",
-                        style={
-                            'font-weight': 'light',
-                            'font-size': 36,
-                            'padding': 0,
-                            'textAlign': 'center',
-                            'margin-bottom': 0
-                        })
-            ], 
-            align="center", width=5
-            )
-    ]),
-    html.Br(),
-    dbc.Row(
-        dbc.Col([
-            dcc.Markdown(
-                children = """
-                ---
-                """,
-                className='md'),
-            dcc.Graph(id='graph-main1',
-                      figure=plot_weekly_rating(df, 'item_rating')
-            )
-        ])
-    ),
-    dbc.Row(
-        dbc.Col(
-            dcc.Markdown(
-                children = """
-                ---
-                ### Modeled Comment Sentiment Analysis
-                """,
-                className='md')
-        ),
-    ),
-    dbc.Row([
-        dbc.Col(width=1),
-        dbc.Col(
-            dcc.Graph(id='graph-main4',
-                      figure=plot_sentiment(df)
-            ),    
-            width=5
+                dcc.Markdown(
+                    children = """
+                    ---
+                    """,
+                    className='md'),
+                dcc.Graph(id='graph-main1',
+                          figure=figures.get(ds, 'weekly_rating')
+                ),
+                # every vendor's weekly series, KPIs and items, for the clientside callbacks
+                dcc.Store(id='vendor-aggregates', data=ds.derived('vendor_aggregates'))
+            ])
         ),
-        dbc.Col(
-            dcc.Graph(id='graph-main5',
-                      figure=plot_weekly_rating(df, 'sentiment')
+        dbc.Row(
+            dbc.Col(
+                dcc.Markdown(
+                    children = """
+                    ---
+                    ### Modeled Comment Sentiment Analysis
+                    """,
+                    className='md')
             ),
-            width=5
         ),
-    ]),
-    dbc.Row([
-        dbc.Col([
-            dcc.Markdown(
-                children = """
-                ---
-                ### Most Reviewed Items
-                """,
-                className='md'),
-            html.Br(),
-            dcc.Graph(id='graph-main3',
-                      figure=make_items_plot(df))
-        ])
-    ]),
-    html.Br(),
-    dbc.Row(
-        dbc.Col([
-            dcc.Markdown(
-                children = """
-                ---
-                ### Comments from Consumers
-                """,
-                className='md'),
-            html.Br(),
-            dcc.RadioItems(
-                id='radio',
-                options=[
-                    {'label': 'All', 'value': 'all'},
-                    {'label': 'Positive', 'value': 'pos'},
-                    {'label': 'Negative', 'value': 'neg'}
-                ],
-                value='all',
-                inline=True,
-                labelStyle={'display': 'inline-block', 'margin-right': '20px'}
+        dbc.Row([
+            dbc.Col(width=1),
+            dbc.Col(
+                dcc.Graph(id='graph-main4',
+                          figure=figures.get(ds, 'sentiment')
+                ),    
+                width=5
+            ),
+            dbc.Col(
+                dcc.Graph(id='graph-main5',
+                          figure=figures.get(ds, 'weekly_sentiment')
+                ),
+                width=5
             ),
-            html.Br(),
-            html.Img(id='graph-main2',
-                    src=make_word_cloud_image(df))
         ]),
+        dbc.Row([
+            dbc.Col([
+                dcc.Markdown(
+                    children = """
+                    ---
+                    ### Most Reviewed Items
+                    """,
+                    className='md'),
+                html.Br(),
+                dcc.Graph(id='graph-main3',
+                          figure=figures.get(ds, 'items')),
+                dcc.Markdown(
+                    children = """
+                    Pick an item, or click one above, to see its weekly ratings.
+                    """,
+                    className='md'),
+                dcc.Dropdown(
+                    id='item_id',
+                    options=sorted(df.item_id.cat.categories.astype(str), key=lambda i: (len(i), i)),
+                    value=str(ds.derived('top_items')['all']['item_id'].iloc[0]),
+                    clearable=False
+                ),
+                dcc.Graph(id='item-trend',
+                          figure=figures.get(ds, 'item_trend'))
+            ])
+        ]),
+        html.Br(),
+        dbc.Row(
+            dbc.Col([
+                dcc.Markdown(
+                    children = """
+                    ---
+                    ### Comments from Consumers
+                    """,
+                    className='md'),
+                html.Br(),
+                dcc.RadioItems(
+                    id='radio',
+                    options=[
+                        {'label': 'All', 'value': 'all'},
+                        {'label': 'Positive', 'value': 'pos'},
+                        {'label': 'Negative', 'value': 'neg'}
+                    ],
+                    value='all',
+                    inline=True,
+                    labelStyle={'display': 'inline-block', 'margin-right': '20px'}
+                ),
+                html.Br(),
+                html.Img(id='graph-main2',
+                        src=wordclouds.url(ds)),
+                # polls for the full word cloud while a preview is shown
+                dcc.Interval(id='wordcloud-poll',
+                             interval=WORDCLOUD_POLL_MS,
+                             disabled=True)
+            ]),
         
-    ),
-    dbc.Row([
-        dbc.Col(
-            [
-            html.Br()
-            ]
         ),
-        dbc.Col(width=1),
-        dbc.Col(
-            [
-            html.Br()
-            ]
-        )
-    ]),
+        dbc.Row([
+            dbc.Col(
+                [
+                html.Br()
+                ]
+            ),
+            dbc.Col(width=1),
+            dbc.Col(
+                [
+                html.Br()
+                ]
+            )
+        ]),
 
-    dbc.Row([
-        dbc.Col(
-            [
-            html.Br()
-            ]
-        ),
-        dbc.Col(width=1),
-        dbc.Col(
-            [
-            html.Br()
-            ]
-        )
-    ]),
-    dbc.Row([
-        dbc.Col([
-            dcc.Markdown(
-                children = """
-                ---
-                ### Sample Consumer Reviews
-                """,
-                className='md'),
-            html.Br(),
-            dag.AgGrid(
-                id="datatable-time",
-                rowData=df[['order_date', 'item_rating', 'consumer_comment']].to_dict("records"),
-                className="ag-theme-material",
-                columnDefs=columnDefs,
-                columnSize="responsiveSizeToFit",
-                defaultColDef=defaultColDef,
-                dashGridOptions={"undoRedoCellEditing": True,
-                "cellSelection": "single",
-                "rowSelection": "single"},
-                # csvExportParams={"fileName": "top02_arrest_rate.csv", "columnSeparator": ","},
-                # style = {'width': '100%', 'color': 'grey'}
-                ),
-        ])
-    ]),
-    dbc.Row([
-        dbc.Col(
-            [
-            html.Br()
-            ]
-        ),
-        dbc.Col(width=1),
-        dbc.Col(
+        dbc.Row([
+            dbc.Col(
+                [
+                html.Br()
+                ]
+            ),
+            dbc.Col(width=1),
+            dbc.Col(
+                [
+                html.Br()
+                ]
+            )
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dcc.Markdown(
+                    children = """
+                    ---
+                    ### Sample Consumer Reviews
+                    """,
+                    className='md'),
+                dbc.Row([
+                    dbc.Col(
+                        dcc.Input(
+                            id='search',
+                            type='search',
+                            debounce=True,
+                            placeholder='Search comments, e.g. cold chicken OR soggy fries',
+                            style={'width': '100%'}),
+                        width=7),
+                    dbc.Col(
+                        dcc.DatePickerRange(
+                            id='date-range',
+                            min_date_allowed=df.order_date.min().date(),
+                            max_date_allowed=df.order_date.max().date(),
+                            clearable=True),
+                        width=5),
+                ]),
+                html.Small(id='search-info', className='text-muted'),
+                html.A('Download the vendor and dates as CSV', id='reviews-export', href=None,
+                       style={'display': 'none', 'margin-left': '10px'}),
+                html.Br(),
+                dag.AgGrid(
+                    id="datatable-time",
+                    # rows are fetched a block at a time through `get_review_rows`
+                    rowModelType="infinite",
+                    className="ag-theme-material",
+                    columnDefs=columnDefs,
+                    columnSize="responsiveSizeToFit",
+                    defaultColDef=defaultColDef,
+                    dashGridOptions={"undoRedoCellEditing": True,
+                    "cellSelection": "single",
+                    "rowSelection": "single",
+                    "cacheBlockSize": GRID_BLOCK_SIZE,
+                    "maxBlocksInCache": 20},
+                    # csvExportParams={"fileName": "top02_arrest_rate.csv", "columnSeparator": ","},
+                    # style = {'width': '100%', 'color': 'grey'}
+                    ),
+                dcc.Store(id='datatable-rows'),
+            ])
+        ]),
+        dbc.Row([
+            dbc.Col(
+                [
+                html.Br()
+                ]
+            ),
+            dbc.Col(width=1),
+            dbc.Col(
         
-        )
-    ]),
-    html.Br(),
-]
-)
+            )
+        ]),
+        html.Br(),
+    ]
+    )
 
 # ---------------------------------------------------------------------
 # Callbacks
 # ---------------------------------------------------------------------
 
-@app.callback([
-    Output('graph-main1', 'figure'),
-    Output('graph-main5', 'figure'),
-    Output('graph-main4', 'figure'),],
-    Input('vendor_id', 'value')
+# charts and KPI labels are redrawn in the browser from `vendor-aggregates`
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='weekly_figures'),
+    [Output('graph-main1', 'figure'),
+    Output('graph-main5', 'figure')],
+    Input('vendor_id', 'value'),
+    [State('vendor-aggregates', 'data'),
+    State('graph-main1', 'figure'),
+    State('graph-main5', 'figure')],
+    prevent_initial_call=True
 )
-def update_graph_main1(vendor_id):
-    if vendor_id:
-        dff = df[df['vendor_id'] == vendor_id]
-    else:
-        dff = df
-    return plot_weekly_rating(dff, 'item_rating'), plot_weekly_rating(dff, 'sentiment'), plot_sentiment(dff)
 
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='sentiment_figure'),
+    Output('graph-main4', 'figure'),
+    Input('vendor_id', 'value'),
+    [State('vendor-aggregates', 'data'),
+    State('graph-main4', 'figure')],
+    prevent_initial_call=True
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='items_figure'),
+    Output('graph-main3', 'figure'),
+    Input('vendor_id', 'value'),
+    [State('vendor-aggregates', 'data'),
+    State('graph-main3', 'figure')],
+    prevent_initial_call=True
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='clicked_item'),
+    Output('item_id', 'value'),
+    Input('graph-main3', 'clickData'),
+    prevent_initial_call=True
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='kpi_labels'),
+    [Output('mean_agg_rating', 'children'),
+    Output('delta_WoW', 'children'),
+    Output('delta_mean', 'children'),
+    Output('delta_WoW', 'style'),
+    Output('delta_mean', 'style')],
+    Input('vendor_id', 'value'),
+    [State('vendor-aggregates', 'data'),
+    State('delta_WoW', 'style'),
+    State('delta_mean', 'style')]
+)
 
 @app.callback(
+    Output('item-trend', 'figure'),
+    [Input('item_id', 'value'),
+    Input('vendor_id', 'value')],
+    prevent_initial_call=True
+)
+def update_item_trend(item_id, vendor_id):
+    if not item_id:
+        raise PreventUpdate
+    # the layout's figure stays; only its series, mean line and titles change
+    return item_trend_patch(data.current(), item_id, vendor_id)
+
+@app.callback([
     Output('graph-main2', 'src'),
+    Output('wordcloud-poll', 'disabled'),
+    Output('wordcloud-poll', 'n_intervals')],
     [Input('vendor_id', 'value'),
-    Input('radio', 'value')]
+    Input('radio', 'value'),
+    Input('wordcloud-poll', 'n_intervals')]
 )
-def update_graph_main2(vendor_id, review_type):
-    if vendor_id:
-        dff = df[df['vendor_id'] == vendor_id]
-    else:
-        dff = df
-    if review_type:
-        if review_type == 'all':
-            dff = dff
-        elif review_type == 'pos':
-            dff = dff[dff['item_rating'] == 1]
-        else:
-            dff = dff[dff['item_rating'] == 0]
-    return make_word_cloud_image(dff)
+def update_graph_main2(vendor_id, review_type, n_intervals):
+    ds = data.current()
+    polarity = review_type or 'all'
+    render = wordclouds.submit(ds, vendor_id, polarity)
+    if render.done():
+        return wordclouds.url(ds, vendor_id, polarity), True, no_update
+    if ctx.triggered_id != 'wordcloud-poll':
+        # show a preview now and poll until the full image is rendered
+        return wordclouds.url(ds, vendor_id, polarity, preview=True), False, 0
+    if n_intervals * WORDCLOUD_POLL_MS >= wordclouds.WORDCLOUD_TIMEOUT * 1000:
+        return no_update, True, no_update
+    raise PreventUpdate
 
 @app.callback(
-    Output('graph-main3', 'figure'),
-    Input('vendor_id', 'value')
+    Output('vendor_id', 'value'),
+    [Input('reset', 'n_clicks'),
+    Input('leaderboard', 'selectedRows')],
+    prevent_initial_call=True
 )
-def update_graph_main3(vendor_id):
-    return make_items_plot(df, vendor_id)
+def select_vendor_id(n_clicks, selected_rows):
+    if ctx.triggered_id == 'reset':
+        return None
+    if not selected_rows:
+        raise PreventUpdate
+    return selected_rows[0]['vendor_id']
 
-@app.callback(
-    Output('vendor_id', 'value'),
-    Input('reset', 'n_clicks')
+@app.callback([
+    Output('movers-label', 'children'),
+    Output('movers-winners', 'rowData'),
+    Output('movers-losers', 'rowData')],
+    [Input('movers-period', 'value'),
+    Input('movers-window', 'value'),
+    Input('movers-min-reviews', 'value')],
+    prevent_initial_call=True
 )
-def reset_vendor_id(n_clicks):
-    return None
+def update_movers(period, window, min_reviews):
+    if not period or not window:
+        raise PreventUpdate
+    return movers_rows(data.current(), period, int(window), int(min_reviews or 1))
+
+def date_range_filter(start_date, end_date) -> dict:
+    """`order_date` filter model of the days from `start_date` to `end_date`, both included"""
+    conditions = [{'filterType': 'date', 'type': kind, 'dateFrom': f'{day[:10]} 00:00:00'}
+                  for kind, day in (('greaterThanOrEqual', start_date), ('lessThanOrEqual', end_date)) if day]
+    if len(conditions) < 2:
+        return conditions[0] if conditions else None
+    return {'filterType': 'date', 'operator': 'AND', 'conditions': conditions}
 
-@app.callback(
-    Output('datatable-time', 'rowData'),
-    Input('vendor_id', 'value')
+@app.callback([
+    Output('datatable-time', 'filterModel'),
+    Output('search-info', 'children'),
+    Output('reviews-export', 'href'),
+    Output('reviews-export', 'style')],
+    [Input('vendor_id', 'value'),
+    Input('search', 'value'),
+    Input('date-range', 'start_date'),
+    Input('date-range', 'end_date')],
+    State('datatable-time', 'filterModel'),
+    prevent_initial_call=True
 )
-def update_datatable(vendor_id):
+def update_datatable(vendor_id, query, start_date, end_date, filter_model):
+    # the grid refetches its rows whenever its filter model changes
+    filter_model = {col: model for col, model in (filter_model or {}).items()
+                    if col not in ('vendor_id', 'search')}
     if vendor_id:
-        dff = df[df['vendor_id'] == vendor_id]
-    else:
-        dff = df
-    return dff[['order_date', 'item_id', 'item_rating', 'consumer_comment']].to_dict("records")
-
-@ app.callback([
-    Output('mean_agg_rating', 'children'),
-    Output('delta_WoW', 'children'),
-    Output('delta_mean', 'children'),
-    Output('delta_WoW', 'style'),
-    Output('delta_mean', 'style')
+        filter_model['vendor_id'] = {'filterType': 'text', 'type': 'equals', 'filter': vendor_id}
+    if query and query.strip():
+        filter_model['search'] = {'filterType': 'text', 'type': 'contains', 'filter': query.strip()}
+    # a date filter set from the grid's own menu stays until the date range changes
+    if ctx.triggered_id == 'date-range' or start_date or end_date:
+        filter_model.pop('order_date', None)
+        if start_date or end_date:
+            filter_model['order_date'] = date_range_filter(start_date, end_date)
+
+    ds = data.current()
+    info = f"{len(row_model.selection(ds, filter_model)):,} matching reviews" if filter_model else ''
+    if 'search' in filter_model:
+        ignored = ds.derived('search_index').search(filter_model['search']['filter'])[1]
+        if ignored:
+            info += f" (not searched: {', '.join(dict.fromkeys(ignored))})"
+    # the export reads the vendor and dates straight from the file, see `apps.export`
+    href = export.url(vendor_id, start_date, end_date)
+    return filter_model, info, href, {'display': 'inline' if href else 'none', 'margin-left': '10px'}
 
-],
-  Input('vendor_id', 'value')
+@app.callback(
+    Output('datatable-rows', 'data'),
+    Input('datatable-time', 'getRowsRequest')
+)
+def get_review_rows(request):
+    if not request:
+        raise PreventUpdate
+    rows, row_count = row_model.block(data.current(), request, [col['field'] for col in columnDefs if not col.get('hide')])
+    return serialize.columnar(rows, row_count)
+
+# rows travel column by column and are turned into row objects in the browser
+app.clientside_callback(
+    serialize.EXPAND_COLUMNAR,
+    Output('datatable-time', 'getRowsResponse'),
+    Input('datatable-rows', 'data')
 )
-def label_annotations(vendor_id):
-    if vendor_id:
-        dff = df[df['vendor_id'] == vendor_id]
-    else:
-        dff = df
-    last_week = dff.week.max()
-    dff_last_week = dff[dff['week'] == last_week]
-    mean_last_week = dff_last_week.item_rating.mean()
-
-    # Get the mean rating for the week before
-    week_before = dff.week.unique()[-2]
-    dff_week_before = dff[dff['week'] == week_before]
-    mean_week_before = dff_week_before.item_rating.mean()
-
-    # Calculate WoW change
-    delta_WoW = mean_last_week - mean_week_before
-
-    # Calculate difference from mean
-    delta_mean = mean_last_week - dff.item_rating.mean()
-
-    if delta_WoW > 0:
-        delta_wow_style = {
-            'font-weight': 'light',
-            'color': 'green',
-            'padding': 0,
-            'textAlign': 'center',
-            'margin-top': 0
-        }
-    else:
-        delta_wow_style = {
-            'font-weight': 'light',
-            'color': 'red',
-            'padding': 0,
-            'textAlign': 'center',
-            'margin-top': 0
-        }
-    if delta_mean > 0:
-        delta_mean_style = {
-            'font-weight': 'light',
-            'color': 'green',
-            'padding': 0,
-            'textAlign': 'center',
-            'margin-top': 0
-        }
-    else:
-        delta_mean_style = {
-            'font-weight': 'light',
-            'color': 'red',
-            'padding': 0,
-            'textAlign': 'center',
-            'margin-top': 0
-        }
-    return f"{mean_last_week:.1%}", f"{delta_WoW:.2%}", f"{delta_mean:.2%}", delta_wow_style, delta_mean_style
\ No newline at end of file
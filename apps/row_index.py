@@ -0,0 +1,48 @@
+"""
+Row positions of the review frame grouped by vendor or item.
+
+Built once per dataset version: the rows are sorted by the categorical codes
+of one column, with the start/stop offset of each category, so the rows of one
+vendor cost time proportional to that vendor's review count instead of a scan
+of the whole column.
+
+Author: Derrick Lewis
+"""
+import numpy as np
+import pandas as pd
+
+from apps import data
+
+
+class RowIndex:
+
+    def __init__(self, column:pd.Series):
+        codes = column.cat.codes.to_numpy()
+        self.categories = column.cat.categories
+        order = np.argsort(codes, kind='stable')
+        # rows with a missing value have code -1 and sort first
+        self.order = order[np.count_nonzero(codes < 0):]
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.categories))
+        self.offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+
+    def positions(self, value) -> np.ndarray:
+        """Row positions holding `value`, in frame order."""
+        code = self.categories.get_indexer([value])[0]
+        if code < 0:
+            return self.order[:0]
+        return self.order[self.offsets[code]:self.offsets[code + 1]]
+
+    def count(self, value) -> int:
+        return len(self.positions(value))
+
+
+@data.derive('vendor_index')
+def vendor_index(ds:data.Dataset) -> RowIndex:
+    return RowIndex(ds.frames['reviews']['vendor_id'])
+
+
+@data.derive('item_index')
+def item_index(ds:data.Dataset) -> RowIndex:
+    return RowIndex(ds.frames['reviews']['item_id'])
+
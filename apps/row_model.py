@@ -0,0 +1,155 @@
+"""
+Server side of AG Grid's infinite row model.
+
+A grid with `rowModelType='infinite'` asks for one block of rows at a time
+through its `getRowsRequest` prop: the start/end row plus the grid's sort and
+filter models. `block` applies those models to the reviews frame and answers
+with the block and the total row count. The filtered and sorted row positions
+of a request are cached, so scrolling through a selection only slices them.
+
+A text filter on `vendor_id` or `item_id` set to 'equals' is resolved through
+the vendor or item row index instead of a scan. A filter on the `search` column is a comment
+search (see `apps.search`), answered from the inverted index.
+
+Author: Derrick Lewis
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from apps import cache, data, row_index, search
+
+selections = cache.LRUCache('grid_rows')
+
+# Columns whose 'equals' filter is answered from a row index (see `apps.row_index`)
+INDEXED = {'vendor_id': 'vendor_index', 'item_id': 'item_index'}
+
+
+def _text_mask(series:pd.Series, condition:dict) -> np.ndarray:
+    kind = condition['type']
+    if not len(series):
+        return np.zeros(0, dtype=bool)
+    if kind in ('blank', 'notBlank'):
+        blank = (series.isna() | (series.astype(str) == '')).to_numpy()
+        return blank if kind == 'blank' else ~blank
+    if not pd.api.types.is_string_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+        # match each distinct value once, then look the rows up by code
+        codes, uniques = pd.factorize(series)
+        matches = _text_mask(pd.Series(np.asarray(uniques).astype(str)), condition)
+        return np.append(matches, kind in ('notEqual', 'notContains'))[codes]
+    text = series.str.lower()
+    value = str(condition.get('filter') or '').lower()
+    mask = {
+        'equals': lambda: text == value,
+        'notEqual': lambda: text != value,
+        'contains': lambda: text.str.contains(value, regex=False),
+        'notContains': lambda: ~text.str.contains(value, regex=False),
+        'startsWith': lambda: text.str.startswith(value),
+        'endsWith': lambda: text.str.endswith(value),
+    }[kind]()
+    return mask.fillna(kind in ('notEqual', 'notContains')).to_numpy(dtype=bool)
+
+
+def _compare(values:pd.Series, kind:str, low, high=None) -> pd.Series:
+    return {
+        'equals': lambda: values == low,
+        'notEqual': lambda: values != low,
+        'lessThan': lambda: values < low,
+        'lessThanOrEqual': lambda: values <= low,
+        'greaterThan': lambda: values > low,
+        'greaterThanOrEqual': lambda: values >= low,
+        # AG Grid's default range excludes both ends
+        'inRange': lambda: (values > low) & (values < high),
+    }[kind]()
+
+
+def _condition_mask(series:pd.Series, condition:dict) -> np.ndarray:
+    kind = condition['type']
+    filter_type = condition.get('filterType', 'text')
+    if filter_type == 'text':
+        return _text_mask(series, condition)
+    if kind in ('blank', 'notBlank'):
+        blank = series.isna().to_numpy()
+        return blank if kind == 'blank' else ~blank
+    if filter_type == 'date':
+        # the date filter compares calendar days
+        days = series.dt.normalize()
+        low = pd.Timestamp(condition['dateFrom']).normalize()
+        high = pd.Timestamp(condition['dateTo']).normalize() if condition.get('dateTo') else None
+        return _compare(days, kind, low, high).to_numpy(dtype=bool)
+    if filter_type == 'number':
+        return _compare(series, kind, condition['filter'], condition.get('filterTo')).to_numpy(dtype=bool)
+    raise ValueError(f"Unsupported filter type {filter_type!r}")
+
+
+def _column_mask(series:pd.Series, model:dict) -> np.ndarray:
+    """Mask of one column's filter model, which may join several conditions."""
+    conditions = model.get('conditions') or [
+        model[name] for name in ('condition1', 'condition2') if model.get(name)
+    ]
+    if not conditions:
+        return _condition_mask(series, model)
+    masks = [_condition_mask(series, {'filterType': model.get('filterType'), **c}) for c in conditions]
+    return np.logical_or.reduce(masks) if model.get('operator') == 'OR' else np.logical_and.reduce(masks)
+
+
+def _sort_key(series:pd.Series, ascending:bool) -> np.ndarray:
+    """Integer key sorting like `series`, missing values last."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy().astype(np.int64)
+    else:
+        codes = pd.factorize(series, sort=True)[0].astype(np.int64)
+    key = codes if ascending else -codes
+    return np.where(codes < 0, key.max(initial=0) + 1, key)
+
+
+def _indexed(filter_model:dict) -> dict:
+    """`{column: value}` of the `INDEXED` columns filtered by a single 'equals' condition."""
+    picked = {}
+    for column in INDEXED:
+        model = filter_model.get(column) or {}
+        if model.get('type') == 'equals' and model.get('filterType', 'text') == 'text' and model.get('filter') is not None:
+            picked[column] = model['filter']
+    return picked
+
+
+def selection(ds:data.Dataset, filter_model:dict=None, sort_model:list=None) -> np.ndarray:
+    """Positions in the reviews frame of the rows passing `filter_model`, in `sort_model` order."""
+    filter_model, sort_model = filter_model or {}, sort_model or []
+    key = (ds.version, json.dumps(filter_model, sort_keys=True), json.dumps(sort_model))
+    positions = selections.get(key)
+    if positions is not None:
+        return positions
+
+    df = ds.get('reviews', 'dashboard')
+    indexed = _indexed(filter_model)
+    positions = np.arange(len(df))
+    for column, value in indexed.items():
+        # both are sorted row positions
+        positions = search.intersect(ds.derived(INDEXED[column]).positions(value), positions)
+    query = (filter_model.get('search') or {}).get('filter')
+    if query:
+        # both are sorted row positions
+        positions = search.intersect(ds.derived('search_index').search(query)[0], positions)
+    for column, model in filter_model.items():
+        if column == 'search' or column in indexed:
+            continue
+        positions = positions[_column_mask(df[column].iloc[positions], model)]
+    if sort_model:
+        # np.lexsort sorts by the last key first
+        keys = [_sort_key(df[s['colId']].iloc[positions], s['sort'] == 'asc') for s in reversed(sort_model)]
+        positions = positions[np.lexsort(keys)]
+    if data.current().version == ds.version:
+        selections.put(key, positions)
+    return positions
+
+
+def block(ds:data.Dataset, request:dict, columns:list) -> tuple:
+    """
+    Rows of `columns` for a grid's `getRowsRequest`, and the row count of the
+    whole selection.
+    """
+    positions = selection(ds, request.get('filterModel'), request.get('sortModel'))
+    rows = positions[request.get('startRow', 0):request.get('endRow', len(positions))]
+    return ds.get('reviews', 'dashboard').iloc[rows][columns], len(positions)
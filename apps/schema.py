@@ -0,0 +1,99 @@
+"""
+Compact in-memory schema for the review frame.
+
+`eda.py` writes IDs as Python strings, 64-bit ratings/sentiment/topics, both a
+Period and a Timestamp column for each of week and month, and the tokens as a
+column of Python lists. At load time `compact` turns that into:
+
+- categoricals for `vendor_id` and `item_id`
+- int8 `item_rating`/`topics` and float32 `sentiment`
+- one ordered categorical per date bucket (`week_for_plot`, `month_for_plot`,
+  the bucket start dates), dropping the redundant `week`/`month` periods
+- Arrow-backed strings for the other text columns: comments and `order_id`
+  (unique per row, so a categorical would only add codes)
+- `tokenized` as an Arrow `list<dictionary<int32, string>>` column. Its
+  buffers are a flat int32 token-id array, the row offsets into it (CSR) and
+  one vocabulary shared by every row, so slices of the frame keep comparable
+  token ids.
+
+Author: Derrick Lewis
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+CATEGORICAL = ['vendor_id', 'item_id']
+DOWNCAST = {'item_rating': 'int8', 'topics': 'int8', 'sentiment': 'float32'}
+DATE_BUCKETS = {'week_for_plot': 'week', 'month_for_plot': 'month'}
+
+
+def encode_tokens(tokens:pa.ChunkedArray) -> pa.ListArray:
+    """Dictionary-encode a list<string> column against a single vocabulary."""
+    lists = tokens.combine_chunks()
+    ids = pc.dictionary_encode(pc.list_flatten(lists))
+    lengths = pc.fill_null(pc.list_value_length(lists), 0).to_numpy()
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int32)
+    np.cumsum(lengths, out=offsets[1:])
+    return pa.ListArray.from_arrays(pa.array(offsets), ids)
+
+
+def token_ids(tokens:pd.Series) -> tuple:
+    """
+    `(ids, offsets, vocab)` numpy arrays for a compact token column, so row i
+    holds `vocab[ids[offsets[i]:offsets[i+1]]]`.
+    """
+    lists = pa.array(tokens)
+    if isinstance(lists, pa.ChunkedArray):
+        lists = lists.combine_chunks()
+    values = pc.list_flatten(lists)
+    lengths = pc.fill_null(pc.list_value_length(lists), 0).to_numpy()
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return (values.indices.to_numpy(zero_copy_only=False),
+            offsets,
+            values.dictionary.to_numpy(zero_copy_only=False))
+
+
+def _arrow_strings(dtype:pa.DataType):
+    return pd.ArrowDtype(dtype) if pa.types.is_string(dtype) else None
+
+
+def compact(table:pa.Table) -> pd.DataFrame:
+    """Convert a table read from `df.parquet` to the compact frame."""
+    tokens = None
+    if 'tokenized' in table.column_names:
+        tokens = encode_tokens(table.column('tokenized'))
+        table = table.drop(['tokenized'])
+    table = table.drop([col for col in DATE_BUCKETS.values() if col in table.column_names])
+    for col in CATEGORICAL:
+        if col in table.column_names:
+            # encode in Arrow so no Python string is created per row
+            index = table.column_names.index(col)
+            table = table.set_column(index, col, pc.dictionary_encode(table.column(col)))
+    # Arrow-backed columns are taken row-wise by the vendor index; a single
+    # chunk keeps that proportional to the rows taken.
+    frame = table.combine_chunks().to_pandas(types_mapper=_arrow_strings)
+    for col in CATEGORICAL:
+        if col in frame:
+            frame[col] = frame[col].cat.reorder_categories(sorted(frame[col].cat.categories))
+    for col, dtype in DOWNCAST.items():
+        if col in frame:
+            frame[col] = frame[col].astype(dtype)
+    for col in DATE_BUCKETS:
+        if col in frame:
+            frame[col] = pd.Categorical(frame[col], ordered=True)
+    if tokens is not None:
+        frame['tokenized'] = pd.Series(pd.arrays.ArrowExtensionArray(tokens), index=frame.index)
+    return frame
+
+
+def memory_report(before:pd.DataFrame, after:pd.DataFrame) -> pd.DataFrame:
+    """Bytes per column before and after `compact`."""
+    report = pd.DataFrame({
+        'before_bytes': before.memory_usage(deep=True, index=False),
+        'after_bytes': after.memory_usage(deep=True, index=False),
+    })
+    report.loc['total'] = report.sum()
+    report['ratio'] = (report['after_bytes'] / report['before_bytes']).round(3)
+    return report
@@ -0,0 +1,98 @@
+"""
+Full-text search over consumer comments.
+
+An inverted index built once per dataset version from the `tokenized` column:
+for each vocabulary id, the sorted row positions (in the reviews frame) of
+the reviews containing that token, stored CSR-style in one array. A query is
+answered by intersecting and merging posting lists, never by scanning
+`consumer_comment`.
+
+Queries are words separated by spaces, all of which must match, with `OR`
+between alternatives: `cold chicken OR soggy fries` finds reviews mentioning
+both cold and chicken, or both soggy and fries. Words are matched the way
+`eda.py` tokenized the comments (lower case, letters only). Single letters
+and words that are not in the index, e.g. the stopwords `eda.py` dropped,
+are left out of the query and reported back.
+
+Author: Derrick Lewis
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from apps import data, schema
+
+
+class InvertedIndex:
+
+    def __init__(self, tokens:pd.Series):
+        ids, offsets, vocab = schema.token_ids(tokens)
+        n = len(tokens)
+        rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(offsets))
+        # one (token, row) pair per token occurring in a row, ordered by token then row
+        pairs = np.unique(ids.astype(np.int64) * n + rows)
+        self.rows = (pairs % n).astype(np.int32)
+        self.offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs // n, minlength=len(vocab)), out=self.offsets[1:])
+        self.vocab = pd.Index(vocab)
+
+    def postings(self, word:str) -> np.ndarray:
+        """Sorted rows containing `word`."""
+        code = self.vocab.get_indexer([word])[0]
+        if code < 0:
+            return self.rows[:0]
+        return self.rows[self.offsets[code]:self.offsets[code + 1]]
+
+    def __contains__(self, word:str) -> bool:
+        return word in self.vocab
+
+    def all_of(self, words:list) -> np.ndarray:
+        """Rows containing every word, intersecting from the shortest posting list up."""
+        lists = sorted((self.postings(w) for w in words), key=len)
+        if not lists:
+            return self.rows[:0]
+        rows = lists[0]
+        for other in lists[1:]:
+            rows = intersect(rows, other)
+        return rows
+
+    def search(self, query:str) -> tuple:
+        """`(rows, ignored)`: sorted rows matching `query`, and its words not in the index."""
+        clauses, ignored = parse(query), []
+        matches = []
+        for words in clauses:
+            ignored += [w for w in words if not _searchable(w, self)]
+            words = [w for w in words if _searchable(w, self)]
+            if words:
+                matches.append(self.all_of(words))
+        if not matches:
+            return self.rows[:0], ignored
+        return np.unique(np.concatenate(matches)), ignored
+
+
+def intersect(rows:np.ndarray, other:np.ndarray) -> np.ndarray:
+    """Values of sorted `rows` also in sorted `other`, in O(len(rows) log len(other))."""
+    if not len(rows) or not len(other):
+        return rows[:0]
+    found = np.minimum(np.searchsorted(other, rows), len(other) - 1)
+    return rows[other[found] == rows]
+
+
+def _searchable(word:str, index:InvertedIndex) -> bool:
+    # single letters are never searched, even where the tokenizer kept them
+    return len(word) > 1 and word in index
+
+
+def parse(query:str) -> list:
+    """`'cold chicken OR soggy'` -> `[['cold', 'chicken'], ['soggy']]`"""
+    parsed = [
+        [w for w in re.findall(r'[a-z]+', clause.lower()) if w != 'and']
+        for clause in re.split(r'\s+OR\s+', query.strip())
+    ]
+    return [words for words in parsed if words]
+
+
+@data.derive('search_index')
+def search_index(ds:data.Dataset) -> InvertedIndex:
+    return InvertedIndex(ds.frames['reviews']['tokenized'])
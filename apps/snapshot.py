@@ -0,0 +1,133 @@
+"""
+Memory-mapped Arrow snapshots of prepared frames.
+
+The first gunicorn worker to load a dataset version writes the prepared frame
+to an uncompressed Arrow IPC (Feather v2) file on local disk; every worker then
+memory-maps that file. Numeric columns become read-only numpy views of the map
+and string/list columns stay Arrow-backed, so the OS page cache holds a single
+physical copy however many workers or threads are running.
+
+Enabled with `DATA_SNAPSHOT=1`.
+
+`load_files` shares already rendered output the same way: a directory of
+files, e.g. a page's encoded layout and its images, written once per dataset
+version by whichever worker gets there first.
+
+Author: Derrick Lewis
+"""
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+
+ENABLED = os.getenv('DATA_SNAPSHOT', '0') == '1'
+SNAPSHOT_DIR = os.getenv('DATA_SNAPSHOT_DIR', '/tmp/dashapp_snapshot')
+
+
+def path_for(name:str, version:str, columns:list=None) -> str:
+    key = hashlib.sha1(f"{version}|{columns}".encode()).hexdigest()[:16]
+    return os.path.join(SNAPSHOT_DIR, f"{name}-{key}.arrow")
+
+
+@contextmanager
+def _file_lock(path:str):
+    with open(f"{path}.lock", 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _arrow_backed(dtype:pa.DataType):
+    # Columns numpy can't view zero-copy stay in Arrow memory
+    if pa.types.is_string(dtype) or pa.types.is_large_string(dtype) or pa.types.is_list(dtype):
+        return pd.ArrowDtype(dtype)
+    return None
+
+
+def _table(frame:pd.DataFrame) -> pa.Table:
+    table = pa.Table.from_pandas(frame)
+    # pandas can't parse back the names of nested Arrow dtypes it records in
+    # the metadata; `read` restores those columns through `_arrow_backed`.
+    meta = json.loads(table.schema.metadata[b'pandas'])
+    for col in meta['columns']:
+        if str(col['numpy_type']).endswith('[pyarrow]'):
+            col['numpy_type'] = 'object'
+    return table.replace_schema_metadata({**table.schema.metadata, b'pandas': json.dumps(meta)})
+
+
+def write(frame:pd.DataFrame, path:str) -> None:
+    table = _table(frame)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def read(path:str) -> pd.DataFrame:
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    return table.to_pandas(split_blocks=True, types_mapper=_arrow_backed)
+
+
+def load(name:str, version:str, build, columns:list=None) -> tuple:
+    """
+    Return `(frame, path)` for the snapshot of `name` at `version`, calling
+    `build()` for the prepared frame only if no worker has written it yet.
+    Snapshots of older versions are removed once the new one is in place.
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = path_for(name, version, columns)
+    if not os.path.exists(path):
+        with _file_lock(path):
+            if not os.path.exists(path):
+                write(build(), path)
+                for old in glob.glob(os.path.join(SNAPSHOT_DIR, f"{name}-*.arrow*")):
+                    if not old.startswith(path):
+                        os.remove(old)
+    return read(path), path
+
+
+def _remove_others(name:str, path:str) -> None:
+    for old in glob.glob(os.path.join(SNAPSHOT_DIR, f"{name}-*")):
+        if not old.startswith(path):
+            if os.path.isdir(old):
+                shutil.rmtree(old, ignore_errors=True)
+            else:
+                os.remove(old)
+
+
+def load_files(name:str, version:str, build, sources:list=()) -> dict:
+    """
+    Return `{filename: bytes}` of the snapshot directory of `name` at
+    `version`, calling `build()` for that dict only if no worker has written
+    it yet. The contents of the `sources` files go into the key too, so a
+    snapshot is not served to code that would render it differently.
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    digest = hashlib.sha1(version.encode())
+    for source in sources:
+        with open(source, 'rb') as f:
+            digest.update(f.read())
+    path = os.path.join(SNAPSHOT_DIR, f"{name}-{digest.hexdigest()[:16]}")
+    if not os.path.isdir(path):
+        with _file_lock(path):
+            if not os.path.isdir(path):
+                tmp = f"{path}.{os.getpid()}.tmp"
+                os.makedirs(tmp, exist_ok=True)
+                for filename, content in build().items():
+                    with open(os.path.join(tmp, filename), 'wb') as f:
+                        f.write(content)
+                os.replace(tmp, path)
+                _remove_others(name, path)
+    files = {}
+    for filename in os.listdir(path):
+        with open(os.path.join(path, filename), 'rb') as f:
+            files[filename] = f.read()
+    return files
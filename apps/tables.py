@@ -15,5 +15,29 @@ columnDefs = [
     {'headerName': 'Date', 'field': 'order_date', 'type': 'dateColumn', 'filter': 'agDateColumnFilter', 'filterParams': {'comparator': 'equals', 'browserDatePicker': True}, 'valueFormatter': 'data.value ? new Date(data.value).toLocaleDateString() : ""'},
     {'headerName': 'Food Item', 'field': 'item_id'},
     {'headerName': 'Rating', 'field': 'item_rating', 'filter':True},
-    {'headerName': 'Comment', 'field': 'consumer_comment', 'width': 500},   
- ]
\ No newline at end of file
+    {'headerName': 'Comment', 'field': 'consumer_comment', 'width': 500},
+    # never shown, the vendor dropdown and the search box filter the grid through them
+    {'headerName': 'Vendor ID', 'field': 'vendor_id', 'hide': True, 'filter': 'agTextColumnFilter'},
+    {'headerName': 'Search', 'field': 'search', 'hide': True, 'filter': 'agTextColumnFilter'},
+ ]
+
+leaderboardColumnDefs = [
+    {'headerName': 'Vendor ID', 'field': 'vendor_id', 'filter': True},
+    {'headerName': 'Last Week', 'field': 'last_week_start'},
+    {'headerName': 'Reviews Last Week', 'field': 'reviews_last_week', 'filter': 'agNumberColumnFilter'},
+    {'headerName': 'Rating Last Week', 'field': 'mean_last_week', 'filter': 'agNumberColumnFilter', 'valueFormatter': {'function': 'd3.format(".1%")(params.value)'}},
+    {'headerName': 'Change WoW', 'field': 'delta_WoW', 'filter': 'agNumberColumnFilter', 'valueFormatter': {'function': 'params.value == null ? "" : d3.format(".2%")(params.value)'}},
+    {'headerName': 'Difference from Mean', 'field': 'delta_mean', 'filter': 'agNumberColumnFilter', 'valueFormatter': {'function': 'd3.format(".2%")(params.value)'}},
+    {'headerName': 'Total Reviews', 'field': 'total_reviews', 'filter': 'agNumberColumnFilter'},
+ ]
+
+# winners and losers tables of `movers.winners_and_losers`
+changeColumnDefs = [
+    {"headerName": "Vendor ID", "field": "Vendor ID"},
+    {
+        "headerName": "Change in Rating",
+        "field": "Change in Rating",
+        "type": "numericColumn",
+        "valueFormatter": {"function": "d3.format(',.1%')(params.value)"},
+    }
+]
@@ -0,0 +1,73 @@
+"""
+Token counts of the reviews as a sparse vendor x rating by vocabulary matrix.
+
+Built once per dataset version from the CSR buffers of the compact `tokenized`
+column (see `apps.schema`): row `vendor_code * len(ratings) + rating_position`
+holds how often each vocabulary id occurs in that vendor's reviews with that
+rating. Word frequencies of any vendor/polarity selection are then a sum over
+a handful of sparse rows, and the top words an argpartition of that sum.
+
+Author: Derrick Lewis
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from apps import data, schema
+
+
+class TermMatrix:
+
+    def __init__(self, df:pd.DataFrame):
+        vendors = df['vendor_id']
+        self.vendors = vendors.cat.categories
+        self.ratings = np.unique(df['item_rating'].to_numpy())
+        ids, offsets, self.vocab = schema.token_ids(df['tokenized'])
+        rows = (vendors.cat.codes.to_numpy().astype(np.int64) * len(self.ratings)
+                + np.searchsorted(self.ratings, df['item_rating'].to_numpy()))
+        token_rows = np.repeat(rows, np.diff(offsets))
+        # reviews without a vendor are left out, as they are from every vendor selection
+        keep = token_rows >= 0
+        self.counts = sparse.csr_matrix(
+            (np.ones(np.count_nonzero(keep), dtype=np.int32), (token_rows[keep], ids[keep])),
+            shape=(len(self.vendors) * len(self.ratings), len(self.vocab)),
+        )
+        self.totals = np.bincount(ids, minlength=len(self.vocab))
+
+    def rows(self, vendor_id=None, rating=None) -> np.ndarray:
+        """Matrix rows of one vendor and/or rating; every row when both are None."""
+        vendors = (np.arange(len(self.vendors)) if vendor_id is None
+                   else self.vendors.get_indexer([vendor_id]))
+        vendors = vendors[vendors >= 0]
+        ratings = (np.arange(len(self.ratings)) if rating is None
+                   else np.flatnonzero(self.ratings == rating))
+        return (vendors[:, None] * len(self.ratings) + ratings).ravel()
+
+    def frequencies(self, vendor_id=None, rating=None) -> np.ndarray:
+        """Count of every vocabulary id in the selected reviews."""
+        if vendor_id is None and rating is None:
+            return self.totals
+        return np.asarray(self.counts[self.rows(vendor_id, rating)].sum(axis=0)).ravel()
+
+    def word_frequencies(self, vendor_id=None, rating=None) -> dict:
+        """`{word: count}` of the words in the selected reviews, for `WordCloud.fit_words`."""
+        counts = self.frequencies(vendor_id, rating)
+        present = np.flatnonzero(counts)
+        return dict(zip(self.vocab[present].tolist(), counts[present].tolist()))
+
+    def top(self, k:int, vendor_id=None, rating=None) -> pd.DataFrame:
+        """The `k` most frequent words, ties in vocabulary order like `Counter.most_common`."""
+        counts = self.frequencies(vendor_id, rating)
+        k = min(k, np.count_nonzero(counts))
+        candidates = np.argpartition(-counts, k - 1)[:k] if k else counts[:0]
+        # argpartition leaves ties at the k-th count unordered; take the first ids
+        threshold = counts[candidates].min() if k else 0
+        candidates = np.union1d(candidates[counts[candidates] > threshold],
+                                np.flatnonzero(counts == threshold)[:k])
+        order = np.lexsort((candidates, -counts[candidates]))[:k]
+        return pd.DataFrame({'word': self.vocab[candidates[order]], 'count': counts[candidates[order]]})
+
+
+@data.derive('term_matrix')
+def term_matrix(ds:data.Dataset) -> TermMatrix:
+    return TermMatrix(ds.frames['reviews'][['vendor_id', 'item_rating', 'tokenized']])
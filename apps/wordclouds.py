@@ -0,0 +1,253 @@
+"""
+Word cloud images of review tokens.
+
+Rendering a 1000x500 cloud and encoding it as PNG takes most of a second, so
+the encoded bytes are kept in an LRU cache keyed by (dataset version, vendor,
+polarity, size), where polarity is 'all', 'pos' or 'neg' and a vendor of None
+means every vendor. Set `WORDCLOUD_PRERENDER` to a number of vendors to
+render the clouds of the most reviewed ones in the background whenever a
+dataset is loaded.
+
+Renders run in a small process pool (`WORDCLOUD_WORKERS`), so the layout work
+doesn't hold the GIL of the worker serving the other callbacks, and requests
+for a key already being rendered wait on that render. While the full image
+renders, the dashboard shows a preview laid out at a quarter of the size. A pool
+that loses a worker, e.g. killed for memory, is replaced on the next render.
+
+Pages don't embed the images. They link to `/wordclouds/<version>/<polarity>.png`
+(see `url`), which is served with an ETag and `Cache-Control: immutable`. A
+dataset version never changes, so the browser keeps every cloud it has seen.
+Layouts are seeded from the cache key, so a cloud rendered again, by another
+worker or after eviction, has the same bytes and ETag.
+
+Author: Derrick Lewis
+"""
+import functools
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from urllib.parse import urlencode
+
+import numpy as np
+from flask import Response, abort, redirect, request
+from PIL import Image, PngImagePlugin  # noqa: F401, imported before the pool forks
+from wordcloud import WordCloud
+
+from apps import cache, data, row_index, term_matrix
+from main import server
+
+WORDCLOUD_CACHE_ENTRIES = int(os.getenv('WORDCLOUD_CACHE_ENTRIES', 256))
+WORDCLOUD_CACHE_MB = float(os.getenv('WORDCLOUD_CACHE_MB', 64))
+WORDCLOUD_PRERENDER = int(os.getenv('WORDCLOUD_PRERENDER', 0))
+WORDCLOUD_WORKERS = int(os.getenv('WORDCLOUD_WORKERS', 2))
+WORDCLOUD_TIMEOUT = float(os.getenv('WORDCLOUD_TIMEOUT', 10))
+
+WIDTH, HEIGHT = 1000, 500
+MAX_WIDTH, MAX_HEIGHT = 2000, 1000
+# previews are laid out on a canvas this many times smaller, then scaled up
+PREVIEW_SCALE = 4
+
+# Reviews shown for each polarity, by `item_rating`
+POLARITY = {'all': None, 'pos': 1, 'neg': 0}
+
+images = cache.LRUCache('wordclouds', WORDCLOUD_CACHE_ENTRIES, WORDCLOUD_CACHE_MB * 2**20)
+
+_pool = None
+# key -> Future of the render in progress
+_pending = {}
+_pending_lock = threading.RLock()
+
+
+def _seed(key:tuple) -> int:
+    """Layout seed of a cloud's cache key, so the same cloud always renders to the same bytes."""
+    return int(hashlib.sha1(repr(key[:5]).encode()).hexdigest()[:8], 16)
+
+
+def render(frequencies:dict, width:int=WIDTH, height:int=HEIGHT, scale:int=1, seed:int=None) -> bytes:
+    """
+    PNG of the word cloud of a `{word: count}` mapping, blank when it is empty.
+    With `scale` > 1 the words are laid out on a smaller canvas, which is much
+    faster, and drawn at the full size. `seed` fixes the layout and colours.
+    """
+    if frequencies:
+        wc = WordCloud(
+            background_color='white',
+            width=width // scale,
+            height=height // scale,
+            scale=scale,
+            random_state=seed,
+        )
+        wc.fit_words(frequencies)
+        image = wc.to_image()
+    else:
+        image = Image.new('RGB', (width, height), 'white')
+    img = BytesIO()
+    image.save(img, format='PNG')
+    return img.getvalue()
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _pending_lock:
+        if _pool is None:
+            # Workers are forked, so they start at once and share the loaded
+            # modules. By then the refresh, load hook and artifact cache threads
+            # are running; a fork copies only the calling thread, but also any
+            # lock another thread held at that moment. A worker only ever runs
+            # `render` on the frequencies it is sent: WordCloud, PIL and numpy,
+            # all imported here beforehand (the PNG plugin included), so it never
+            # takes the import lock or touches the datasets, caches, artifact
+            # cache or their locks.
+            _pool = ProcessPoolExecutor(WORDCLOUD_WORKERS, mp_context=multiprocessing.get_context('fork'))
+        return _pool
+
+
+def _drop_pool(broken:ProcessPoolExecutor) -> None:
+    """Forget a pool that lost a worker, e.g. killed for memory, and the renders it had."""
+    global _pool
+    with _pending_lock:
+        if _pool is broken:
+            _pool = None
+            _pending.clear()
+    print("Word cloud pool lost a worker, starting a new one")
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _broken(future:Future) -> bool:
+    return future.done() and isinstance(future.exception(), BrokenProcessPool)
+
+
+def _rendered(key:tuple, future:Future) -> None:
+    with _pending_lock:
+        if _pending.get(key) is future:
+            del _pending[key]
+    # a render that finished after a reload belongs to a retired version
+    if future.exception() is None and data.current().version == key[0]:
+        images.put(key, future.result())
+
+
+def submit(ds:data.Dataset, vendor_id:str=None, polarity:str='all', width:int=WIDTH, height:int=HEIGHT) -> Future:
+    """
+    Future of the word cloud of one vendor's reviews, or every vendor's, as PNG
+    bytes. Rendered in the process pool unless cached or already in progress.
+    """
+    key = (ds.version, vendor_id, polarity, width, height)
+    future = Future()
+    image = images.get(key)
+    if image is not None:
+        future.set_result(image)
+        return future
+    frequencies = ds.derived('term_matrix').word_frequencies(vendor_id, POLARITY[polarity])
+    with _pending_lock:
+        if key in _pending and not _broken(_pending[key]):
+            return _pending[key]
+        pool = _executor()
+        try:
+            future = pool.submit(render, frequencies, width, height, 1, _seed(key))
+        except BrokenProcessPool:
+            _drop_pool(pool)
+            future = _executor().submit(render, frequencies, width, height, 1, _seed(key))
+        _pending[key] = future
+    future.add_done_callback(functools.partial(_rendered, key))
+    return future
+
+
+def png(ds:data.Dataset, vendor_id:str=None, polarity:str='all', width:int=WIDTH, height:int=HEIGHT,
+        timeout:float=WORDCLOUD_TIMEOUT) -> bytes:
+    """
+    Word cloud as PNG bytes, waiting up to `timeout` seconds for the render.
+    On a timeout the render carries on and is cached when it finishes.
+    """
+    try:
+        return submit(ds, vendor_id, polarity, width, height).result(timeout)
+    except BrokenProcessPool:
+        # its worker died mid-render; `submit` renders it again in a new pool
+        return submit(ds, vendor_id, polarity, width, height).result(timeout)
+
+
+def keep(ds:data.Dataset, image:bytes, vendor_id:str=None, polarity:str='all', width:int=WIDTH, height:int=HEIGHT) -> None:
+    """Cache a cloud rendered elsewhere, e.g. read back from a page snapshot."""
+    images.put((ds.version, vendor_id, polarity, width, height), image)
+
+
+def preview(ds:data.Dataset, vendor_id:str=None, polarity:str='all', width:int=WIDTH, height:int=HEIGHT) -> bytes:
+    """Low resolution stand-in for `png`, rendered in this process."""
+    key = (ds.version, vendor_id, polarity, width, height, 'preview')
+    image = images.get(key)
+    if image is None:
+        frequencies = ds.derived('term_matrix').word_frequencies(vendor_id, POLARITY[polarity])
+        image = render(frequencies, width, height, PREVIEW_SCALE, _seed(key))
+        if data.current().version == ds.version:
+            images.put(key, image)
+    return image
+
+
+def url(ds:data.Dataset, vendor_id:str=None, polarity:str='all', width:int=WIDTH, height:int=HEIGHT,
+        preview:bool=False) -> str:
+    """Address of a word cloud image of `ds`, served by `serve_png`."""
+    args = {'vendor_id': vendor_id} if vendor_id else {}
+    if (width, height) != (WIDTH, HEIGHT):
+        args.update(width=width, height=height)
+    if preview:
+        args.update(preview=1)
+    query = f'?{urlencode(args)}' if args else ''
+    return f'/wordclouds/{ds.version}/{polarity}.png{query}'
+
+
+@server.route('/wordclouds/<version>/<polarity>.png')
+def serve_png(version:str, polarity:str):
+    ds = data.current()
+    vendor_id = request.args.get('vendor_id') or None
+    is_preview = request.args.get('preview', 0, type=int) == 1
+    width = request.args.get('width', WIDTH, type=int)
+    height = request.args.get('height', HEIGHT, type=int)
+    if polarity not in POLARITY or not (0 < width <= MAX_WIDTH and 0 < height <= MAX_HEIGHT):
+        abort(404)
+    if vendor_id and ds.derived('vendor_index').count(vendor_id) == 0:
+        abort(404)
+    if version != ds.version:
+        # a page rendered before a reload; send it to the current image
+        response = redirect(url(ds, vendor_id, polarity, width, height, is_preview))
+        response.cache_control.no_cache = True
+        return response
+    final = True
+    if is_preview:
+        image = preview(ds, vendor_id, polarity, width, height)
+    else:
+        try:
+            image = png(ds, vendor_id, polarity, width, height)
+        except TimeoutError:
+            image, final = preview(ds, vendor_id, polarity, width, height), False
+    response = Response(image, mimetype='image/png')
+    if not final:
+        # the full image is still rendering, ask again next time
+        response.cache_control.no_store = True
+        return response
+    response.set_etag(hashlib.sha1(image).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = 365 * 24 * 3600
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+
+def top_vendors(ds:data.Dataset, n:int) -> list:
+    """The `n` vendors with the most reviews."""
+    index = ds.derived('vendor_index')
+    counts = np.diff(index.offsets)
+    return index.categories[np.argsort(-counts, kind='stable')[:n]].tolist()
+
+
+@data.on_load
+def prerender(ds:data.Dataset) -> None:
+    if WORDCLOUD_PRERENDER <= 0:
+        return
+    for vendor_id in [None] + top_vendors(ds, WORDCLOUD_PRERENDER):
+        for polarity in POLARITY:
+            if data.current().version != ds.version:
+                return
+            png(ds, vendor_id, polarity, timeout=None)
+    print(f"Word clouds pre-rendered for {WORDCLOUD_PRERENDER} vendors ({ds.version})")
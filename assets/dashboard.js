@@ -0,0 +1,111 @@
+/*
+Clientside callbacks of the dashboard (apps/page2.py).
+
+A vendor change redraws the weekly charts, the sentiment histogram, the items
+chart and the KPI labels from the `vendor-aggregates` store, without a round
+trip to the server. Each figure is the one already on the page with its
+series swapped, so the layout and template built by the server are kept.
+
+Author: Derrick Lewis
+*/
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    dashboard: {
+        weekly_figures: function(vendor_id, store, rating_figure, sentiment_figure) {
+            const series = store && store.vendors[vendor_id || 'all'];
+            if (!series) {
+                return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+            }
+            const weeks = series.week.map(code => store.weeks[code]);
+            return [
+                weeklyFigure(rating_figure, weeks, series.item_rating),
+                weeklyFigure(sentiment_figure, weeks, series.sentiment),
+            ];
+        },
+
+        sentiment_figure: function(vendor_id, store, figure) {
+            const series = store && store.vendors[vendor_id || 'all'];
+            if (!series) {
+                return window.dash_clientside.no_update;
+            }
+            const mean = series.sentiment_mean;
+            const top = Math.max(...series.sentiment_bins);
+            const layout = figure.layout;
+            return Object.assign({}, figure, {
+                data: [Object.assign({}, figure.data[0], {y: series.sentiment_bins})],
+                layout: Object.assign({}, layout, {
+                    shapes: [Object.assign({}, layout.shapes[0], {x0: mean, x1: mean, y1: top})],
+                    annotations: [Object.assign({}, layout.annotations[0], {
+                        x: mean,
+                        y: top,
+                        text: 'Mean Sentiment: ' + mean.toFixed(2),
+                    })],
+                }),
+            });
+        },
+
+        items_figure: function(vendor_id, store, figure) {
+            const series = store && store.vendors[vendor_id || 'all'];
+            if (!series) {
+                return window.dash_clientside.no_update;
+            }
+            const items = series.items;
+            const most = Math.max(...items.count);
+            const trace = Object.assign({}, figure.data[0], {
+                x: items.sum,
+                y: items.sum.map((sum, i) => sum / items.count[i]),
+                text: items.item_id,
+                marker: Object.assign({}, figure.data[0].marker, {
+                    size: items.count.map(count => count / most * 40 + 10),
+                }),
+            });
+            return Object.assign({}, figure, {data: [trace]});
+        },
+
+        clicked_item: function(click_data) {
+            if (!click_data || !click_data.points.length) {
+                return window.dash_clientside.no_update;
+            }
+            return click_data.points[0].text;
+        },
+
+        kpi_labels: function(vendor_id, store, wow_style, mean_style) {
+            const series = store && store.vendors[vendor_id || 'all'];
+            if (!series) {
+                return Array(5).fill(window.dash_clientside.no_update);
+            }
+            const [mean_last_week, delta_WoW, delta_mean] = series.kpis;
+            const color = value => value > 0 ? 'green' : 'red';
+            return [
+                percent(mean_last_week, 1),
+                // a vendor with a single week of reviews has no week-over-week change
+                delta_WoW === null ? 'n/a' : percent(delta_WoW, 2),
+                percent(delta_mean, 2),
+                Object.assign({}, wow_style, {color: color(delta_WoW)}),
+                Object.assign({}, mean_style, {color: color(delta_mean)}),
+            ];
+        },
+    },
+});
+
+function percent(value, digits) {
+    return (value * 100).toFixed(digits) + '%';
+}
+
+// `figure` from `plot_weekly_rating` with its bars, mean line and annotation moved to `means`
+function weeklyFigure(figure, weeks, means) {
+    const overall = means.reduce((total, mean) => total + mean, 0) / means.length;
+    const first = weeks[0];
+    const last = weeks[weeks.length - 1];
+    const layout = figure.layout;
+    return Object.assign({}, figure, {
+        data: [Object.assign({}, figure.data[0], {x: weeks, y: means})],
+        layout: Object.assign({}, layout, {
+            shapes: [Object.assign({}, layout.shapes[0], {x0: first, x1: last, y0: overall, y1: overall})],
+            annotations: [Object.assign({}, layout.annotations[0], {
+                x: last,
+                y: overall,
+                text: 'Overall Average Rating: ' + percent(overall, 2),
+            })],
+        }),
+    });
+}
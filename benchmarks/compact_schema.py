@@ -0,0 +1,34 @@
+"""
+Memory of the review frame as `eda.py` writes it versus the compact schema
+from `apps.schema`, column by column.
+
+'python benchmarks/compact_schema.py /tmp/reviews/df.parquet'
+
+pandas counts a list column as the list objects only, so the `tokenized`
+before figure leaves out the strings inside them.
+
+Author: Derrick Lewis
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from apps import schema
+
+
+if __name__ == '__main__':
+    path = sys.argv[1]
+    start = time.perf_counter()
+    before = pd.read_parquet(path)
+    print(f"read as written: {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    after = schema.compact(pq.read_table(path))
+    print(f"read compact: {time.perf_counter() - start:.2f}s")
+    report = schema.memory_report(before, after)
+    report[['before_mb', 'after_mb']] = (report[['before_bytes', 'after_bytes']] / 2**20).round(1)
+    print(report[['before_mb', 'after_mb', 'ratio']].to_string())
@@ -0,0 +1,72 @@
+"""
+Startup time and memory of N workers loading the review data, with and
+without the memory-mapped Arrow snapshot (`DATA_SNAPSHOT=1`).
+
+Each worker is a fresh process, like a gunicorn worker, that loads the
+registry and then waits until all workers are up before reading its memory
+from /proc. PSS splits shared pages between the processes mapping them, so
+the PSS sum is what the workers really cost together.
+
+'DATA_ROOT=/tmp/reviews python benchmarks/snapshot_workers.py'
+
+Author: Derrick Lewis
+"""
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _memory() -> dict:
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                values[key] = int(rest.split()[0]) * 1024
+    return values
+
+
+def _worker(barrier, results):
+    start = time.perf_counter()
+    from apps import data
+    data.load()
+    seconds = time.perf_counter() - start
+    barrier.wait()
+    results.put({'seconds': seconds, **_memory()})
+    barrier.wait()
+
+
+def run(workers:int, snapshot_mode:bool) -> dict:
+    os.environ['DATA_SNAPSHOT'] = '1' if snapshot_mode else '0'
+    ctx = mp.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    rows = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return {
+        'workers': workers,
+        'snapshot': snapshot_mode,
+        'slowest_start_s': round(max(r['seconds'] for r in rows), 2),
+        'rss_sum_mb': round(sum(r['Rss'] for r in rows) / 2**20),
+        'pss_sum_mb': round(sum(r['Pss'] for r in rows) / 2**20),
+    }
+
+
+if __name__ == '__main__':
+    snapshot_dir = tempfile.mkdtemp()
+    os.environ['DATA_SNAPSHOT_DIR'] = snapshot_dir
+    try:
+        for snapshot_mode in (False, True):
+            for workers in (1, 2, 4):
+                print(run(workers, snapshot_mode))
+    finally:
+        shutil.rmtree(snapshot_dir)
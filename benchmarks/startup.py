@@ -0,0 +1,49 @@
+"""
+Cold-start time to first byte for each page.
+
+Imports `index` the way gunicorn does, then asks the Dash test client for the
+index HTML and the `display_page` callback for /home, /analysis and
+/dashboard, twice each. Run it once per measurement so every run is a cold
+process.
+
+'DATA_ROOT=/tmp/reviews python benchmarks/startup.py'
+
+Author: Derrick Lewis
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def page_request(client, pathname:str):
+    return client.post('/_dash-update-component', json={
+        'output': 'page-content.children',
+        'outputs': {'id': 'page-content', 'property': 'children'},
+        'inputs': [{'id': 'url', 'property': 'pathname', 'value': pathname}],
+        'changedPropIds': ['url.pathname'],
+    })
+
+
+def main() -> None:
+    start = time.perf_counter()
+    import index
+    timings = {'import_index': time.perf_counter() - start}
+    client = index.server.test_client()
+    client.get('/')
+    timings['first_byte_/'] = time.perf_counter() - start
+    for pathname in ['/home', '/analysis', '/dashboard']:
+        for visit in ('first', 'repeat'):
+            request_start = time.perf_counter()
+            response = page_request(client, pathname)
+            assert response.status_code == 200, response.status_code
+            timings[f'{visit}_{pathname}'] = time.perf_counter() - request_start
+            if pathname == '/home' and visit == 'first':
+                timings['first_byte_/home_since_start'] = time.perf_counter() - start
+    for key, seconds in timings.items():
+        print(f"{key:32s} {seconds:8.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Synthetic review data with the same schema as the frame `eda.py` writes, for
+benchmarking at volumes beyond the ~5k sample.
+
+'python benchmarks/synthetic.py /tmp/reviews 1000000' writes df.parquet and
+topics_df.parquet to /tmp/reviews, ready to use as `DATA_ROOT`.
+
+Author: Derrick Lewis
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+WORDS = np.array([
+    'cold', 'dry', 'chicken', 'great', 'good', 'tasty', 'late', 'rice', 'salad', 'hot',
+    'fresh', 'bland', 'spicy', 'soggy', 'love', 'never', 'again', 'perfect', 'portion',
+    'small', 'delicious', 'burnt', 'missing', 'sauce', 'noodles', 'wrong', 'amazing',
+    'soup', 'fries', 'salty',
+])
+
+
+def make_reviews(n:int=5000, vendors:int=350, seed:int=0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp('2023-07-01') + pd.to_timedelta(rng.integers(0, 110, n), unit='D')
+    # a few vendors get most of the reviews, like the real sample
+    vendor = (rng.zipf(1.3, n) % vendors) + 9000
+    tokens = [list(WORDS[rng.integers(0, len(WORDS), k)]) for k in rng.integers(0, 10, n)]
+    df = pd.DataFrame({
+        'order_id': rng.integers(10**6, 10**7, n).astype(str),
+        'vendor_id': vendor.astype(str),
+        'order_date': dates,
+        'item_id': rng.integers(100, 1100, n).astype(str),
+        'item_rating': rng.integers(0, 2, n),
+        'consumer_comment': [' '.join(t) for t in tokens],
+    })
+    df['week'] = df.order_date.dt.to_period('W')
+    df['week_for_plot'] = df['week'].dt.start_time
+    df['month'] = df.order_date.dt.to_period('M')
+    df['month_for_plot'] = df['month'].dt.start_time
+    df['tokenized'] = tokens
+    df['topics'] = rng.integers(0, 10, n)
+    df['sentiment'] = rng.uniform(-1, 1, n).round(2)
+    return df.sort_values(['vendor_id', 'order_date'], ignore_index=True)
+
+
+def make_topics() -> pd.DataFrame:
+    cols = [f'word_{i}' for i in range(10)]
+    topics_df = pd.DataFrame([list(WORDS[[(t + i) % len(WORDS) for i in range(10)]]) for t in range(10)], columns=cols)
+    topics_df.index.name = 'topic_id'
+    return topics_df
+
+
+if __name__ == '__main__':
+    out = sys.argv[1]
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    os.makedirs(out, exist_ok=True)
+    make_reviews(n).to_parquet(f'{out}/df.parquet', row_group_size=100_000)
+    make_topics().to_parquet(f'{out}/topics_df.parquet')
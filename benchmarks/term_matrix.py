@@ -0,0 +1,58 @@
+"""
+Top-10 words of a vendor/polarity selection from a `Counter` over the token
+lists, as the pages used to count them, versus a sum over the rows of
+`apps.term_matrix.TermMatrix`.
+
+'python benchmarks/term_matrix.py 100000 1000000'
+
+Author: Derrick Lewis
+"""
+import os
+import sys
+import time
+from collections import Counter
+from itertools import chain
+
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from apps import schema
+from apps.term_matrix import TermMatrix
+from benchmarks.synthetic import make_reviews
+
+
+def timed(func, repeat:int=5) -> float:
+    """Best of `repeat` runs, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+if __name__ == '__main__':
+    for n in [int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000]:
+        reviews = make_reviews(n)
+        df = schema.compact(pa.Table.from_pandas(reviews, preserve_index=False))
+        start = time.perf_counter()
+        tm = TermMatrix(df)
+        print(f"\n{n:,} reviews: matrix built in {time.perf_counter() - start:.2f}s, {tm.counts.nnz:,} non-zeros")
+
+        biggest = df['vendor_id'].value_counts().index[0]
+        selections = {
+            'all vendors, positive': (None, 1),
+            f'vendor {biggest}, negative': (biggest, 0),
+            'vendor 9200, all': ('9200', None),
+        }
+        for label, (vendor_id, rating) in selections.items():
+            mask = reviews['item_rating'].notna()
+            if vendor_id is not None:
+                mask &= reviews['vendor_id'] == vendor_id
+            if rating is not None:
+                mask &= reviews['item_rating'] == rating
+            tokens = reviews.loc[mask, 'tokenized']
+            counter = timed(lambda: Counter(chain.from_iterable(tokens)).most_common(10))
+            matrix = timed(lambda: tm.top(10, vendor_id, rating))
+            print(f"{label:>28}: {mask.sum():>8,} reviews  Counter {counter:8.2f}ms  matrix {matrix:6.2f}ms")
@@ -17,7 +17,7 @@ import dash_bootstrap_components as dbc
 from google.cloud import secretmanager
 from plotly_theme_light import plotly_light
 from main import server, app
-from apps import home, page1, page2
+from apps import data, home, page1, page2
 
 pio.templates["plotly_light"] = plotly_light
 pio.templates.default = "plotly_light"
@@ -238,6 +238,10 @@ app.layout = html.Div([
 def display_page(pathname):
     """
     This function is used to route the user to the correct page based on the url
+
+    Page layouts are built from the data on their first visit and memoized,
+    already encoded, for the dataset version, so /home never waits on the data.
+    /analysis is read from a snapshot when another worker has already built it.
     """
     print(pathname)
     if pathname == '/':
@@ -245,9 +249,9 @@ def display_page(pathname):
     elif pathname == '/home':
         return home.layout
     elif pathname == '/analysis':
-        return page1.layout
+        return data.current().derived('analysis_layout_json')
     elif pathname == '/dashboard':
-        return page2.layout
+        return data.current().derived('dashboard_layout_json')
     else:
         return '404'
 